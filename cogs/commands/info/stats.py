@@ -97,6 +97,8 @@ class Stats(commands.Cog):
         embed.add_field(name="Memory Usage",
                         value=f"{floor(process.memory_info().rss/1000/1000)} MB")
         embed.add_field(name="Python Version", value=platform.python_version())
+        embed.add_field(name="User cache",
+                        value=f"{self.bot.settings.user_cache.hits} hits, {self.bot.settings.user_cache.misses} misses")
 
         await ctx.message.reply(embed=embed)
 
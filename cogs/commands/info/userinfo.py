@@ -1,8 +1,8 @@
 import traceback
 import typing
-from math import floor
 
 import discord
+from cogs.utils.leveling import xp_for_level
 from discord.ext import commands, menus
 
 
@@ -47,7 +47,25 @@ class LeaderboardSource(menus.GroupByPageSource):
         return embed
 
 
-class CasesSource(menus.GroupByPageSource):
+class CasesSource(menus.PageSource):
+    """Pages through a user's cases, fetching one page at a time from the database.
+    """
+
+    def __init__(self, settings, user_id, count, per_page):
+        self.settings = settings
+        self.user_id = user_id
+        self.count = count
+        self.per_page = per_page
+
+    def is_paginating(self):
+        return self.count > self.per_page
+
+    def get_max_pages(self):
+        return max(1, -(-self.count // self.per_page))
+
+    async def get_page(self, page_number):
+        return await self.settings.cases(self.user_id, page=page_number, per_page=self.per_page)
+
     async def format_page(self, menu, entry):
         pun_map = {
             "KICK": "Kicked",
@@ -63,7 +81,7 @@ class CasesSource(menus.GroupByPageSource):
         embed = discord.Embed(
             title=f'Cases - {u.warn_points} warn points', color=discord.Color.blurple())
         embed.set_author(name=user, icon_url=user.avatar_url)
-        for case in entry.items:
+        for case in entry:
             timestamp = case.date.strftime("%B %d, %Y, %I:%M %p")
             if case._type == "WARN" or case._type == "LIFTWARN":
                 if case.lifted:
@@ -213,7 +231,7 @@ class UserInfo(commands.Cog):
         embed.add_field(
             name="Level", value=results.level if not results.is_clem else "0", inline=True)
         embed.add_field(
-            name="XP", value=f'{results.xp}/{xp_for_next_level(results.level)}' if not results.is_clem else "0/0", inline=True)
+            name="XP", value=f'{results.xp}/{xp_for_level(results.level)}' if not results.is_clem else "0/0", inline=True)
         rank, overall = await self.bot.settings.leaderboard_rank(results.xp) 
         embed.add_field(name="Rank", value=f"{rank}/{overall}" if not results.is_clem else f"{overall}/{overall}", inline=True)
         embed.set_footer(text=f"Requested by {ctx.author}")
@@ -325,18 +343,16 @@ class UserInfo(commands.Cog):
                     f"Couldn't find user with ID {user}")
             ctx.args[2] = user
 
-        results = await self.bot.settings.cases(user.id)
-        if len(results.cases) == 0:
+        count = await self.bot.settings.count_cases(user.id)
+        if count == 0:
             if isinstance(user, int):
                 raise commands.BadArgument(
                     f'User with ID {user.id} had no cases.')
             else:
                 raise commands.BadArgument(f'{user.mention} had no cases.')
-        cases = [case for case in results.cases if case._type != "UNMUTE"]
-        cases.reverse()
 
         menus = MenuPages(source=CasesSource(
-            cases, key=lambda t: 1, per_page=9), clear_reactions_after=True)
+            self.bot.settings, user.id, count, per_page=9), clear_reactions_after=True)
         await ctx.message.delete()
         await menus.start(ctx)
 
@@ -358,17 +374,6 @@ class UserInfo(commands.Cog):
             traceback.print_exc()
 
 
-def xp_for_next_level(next):
-    level = 0
-    xp = 0
-
-    for _ in range(0, next):
-        xp = xp + 45 * level * (floor(level / 10) + 1)
-        level += 1
-
-    return xp
-
-
 async def determine_emoji(type):
     emoji_dict = {
         "KICK": "👢",
@@ -24,6 +24,21 @@ class Admin(commands.Cog):
         await self.bot.user.edit(avatar=await ctx.message.attachments[0].read())
         await ctx.message.reply(embed=discord.Embed(color=discord.Color.blurple(), description="Done!"), delete_after=5)
         
+    @commands.command(name="recomputelevels")
+    @commands.guild_only()
+    async def recomputelevels(self, ctx: commands.Context):
+        """Recompute every user's level from their XP (admin only)
+        """
+
+        if not self.bot.settings.permissions.hasAtLeast(ctx.guild, ctx.author, 7):
+            raise commands.BadArgument(
+                "You do not have permission to use this command.")
+
+        async with ctx.typing():
+            changed = await self.bot.settings.recompute_levels()
+        await ctx.message.reply(embed=discord.Embed(color=discord.Color.blurple(), description=f"Done! Fixed the level of {changed} users."), delete_after=5)
+
+    @recomputelevels.error
     @setpfp.error
     async def info_error(self, ctx, error):
         await ctx.message.delete(delay=5)
@@ -140,7 +140,7 @@ class Giveaway(commands.Cog):
         await ctx.message.delete()
 
         giveaway = GiveawayDB(_id=message.id, channel=responses['channel'].id, name=responses['name'], winners=responses['winners'], end_time=end_time, sponsor=responses['sponsor'].id)
-        giveaway.save()
+        await self.bot.settings.save(giveaway)
 
         if ctx.channel.id != responses['channel'].id:
             await ctx.send(f"Giveaway started!", embed=embed, delete_after=10)
@@ -153,7 +153,7 @@ class Giveaway(commands.Cog):
         if guild is None:
             return
 
-        giveaways = GiveawayDB.objects(is_ended=False)
+        giveaways = await self.bot.settings.active_giveaways()
         for giveaway in giveaways:
             await self.do_giveaway_update(giveaway, guild)
 
@@ -232,7 +232,7 @@ class Giveaway(commands.Cog):
             the_winner = None
 
         g.previous_winners.append(the_winner.id)
-        g.save()
+        await self.bot.settings.save(g)
 
         await ctx.message.delete()
         channel = ctx.guild.get_channel(g.channel)
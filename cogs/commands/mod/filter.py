@@ -1,6 +1,8 @@
+import re
 import traceback
 
 import discord
+from cogs.utils.wordfilter import MODES, check_regex, combine_regexes
 from data.filterword import FilterWord
 from discord.ext import commands
 from discord.ext import menus
@@ -15,12 +17,44 @@ class FilterSource(menus.GroupByPageSource):
             extra = ""
             if word.piracy:
                 extra = "\nThis is a piracy word"
-            embed.add_field(name=word.word, value=f"Bypassed by: {permissions.level_info(word.bypass)}\nWill report: {word.notify}{extra}")
+            if word.mode != "substring":
+                extra += f"\nMatches as: {word.mode}"
+            if word.shadow:
+                extra += "\nShadow: only logs matches"
+            hits = menu.ctx.bot.settings.filter_word_hits(word)
+            embed.add_field(name=word.word, value=f"Bypassed by: {permissions.level_info(word.bypass)}\nWill report: {word.notify}\nHits: {hits}{extra}")
         embed.set_footer(
             text=f"Page {menu.current_page +1} of {self.get_max_pages()}")
         return embed
 
 
+def split_mode(phrase: str) -> tuple:
+    """Split an optional leading `--mode=<mode>` flag off a phrase to filter.
+
+    Parameters
+    ----------
+    phrase : str
+        The phrase as given to the command, i.e `--mode=word ass`
+
+    Returns
+    -------
+    tuple
+        The match mode (substring if not given) and the phrase without the flag
+    """
+
+    if not phrase.startswith("--mode="):
+        return "substring", phrase
+
+    flag, _, phrase = phrase.partition(" ")
+    mode = flag[len("--mode="):].lower()
+    if mode not in MODES:
+        raise commands.BadArgument(f"Match mode must be one of {', '.join(MODES)}.")
+    phrase = phrase.strip()
+    if not phrase:
+        raise commands.BadArgument("You need to give a phrase to filter after the mode.")
+    return mode, phrase
+
+
 class MenuPages(menus.MenuPages):
     async def update(self, payload):
         if self._can_remove_reactions:
@@ -56,9 +90,7 @@ class Filters(commands.Cog):
             raise commands.BadArgument(
                 "You need to be a moderator or higher to use that command.")
 
-        cur = await self.bot.settings.user(ctx.author.id)
-        cur.offline_report_ping = val
-        cur.save()
+        await self.bot.settings.set_offline_ping(ctx.author.id, val)
 
         if val:
             await ctx.send("You will now be pinged for reports when offline")
@@ -73,6 +105,8 @@ class Filters(commands.Cog):
         Example usage:
         -------------
         `!filteradd false 5 :kek:`
+        `!filteradd true 5 --mode=word ass`
+        `!filteradd true 5 --mode=regex fr+ee\\s*nitro`
 
         Parameters
         ----------
@@ -81,26 +115,81 @@ class Filters(commands.Cog):
         bypass : int
             Level that can bypass this word
         phrase : str
-            Phrase to filter
+            Phrase to filter, optionally starting with `--mode=<mode>` to match it as a substring (default),
+            as whole words only (word) or as a regex (regex)
+        """
+
+        await self.add_word(ctx, notify, bypass, phrase, shadow=False)
+
+    @commands.guild_only()
+    @commands.command(name="filtershadow")
+    async def filtershadow(self, ctx, notify: bool, bypass: int, *, phrase: str) -> None:
+        """Add a word to filter in shadow mode: matches are only logged and counted, nothing is deleted (admin only)
+
+        Example usage:
+        -------------
+        `!filtershadow false 5 :kek:`
+        `!filtershadow true 5 --mode=word ass`
+
+        Parameters
+        ----------
+        notify : bool
+            Whether to generate a report or not when this word is filtered, once it goes live
+        bypass : int
+            Level that can bypass this word
+        phrase : str
+            Phrase to filter, optionally starting with `--mode=<mode>` to match it as a substring (default),
+            as whole words only (word) or as a regex (regex)
         """
 
+        await self.add_word(ctx, notify, bypass, phrase, shadow=True)
+
+    async def add_word(self, ctx, notify: bool, bypass: int, phrase: str, shadow: bool) -> None:
         # must be at least admin
         if not self.bot.settings.permissions.hasAtLeast(ctx.guild, ctx.author, 6):
             await ctx.message.delete()
             raise commands.BadArgument(
                 "You need to be an administator or higher to use that command.")
 
+        mode, phrase = split_mode(phrase)
+
+        if mode == "regex":
+            try:
+                check_regex(phrase)
+            except ValueError as e:
+                raise commands.BadArgument(str(e))
+
+            # make sure the new rule still combines with the existing ones into one pattern
+            patterns = [word.word for word in self.bot.settings.guild().filter_words if word.mode == "regex"]
+            try:
+                combine_regexes(patterns + [phrase])
+            except re.error as e:
+                raise commands.BadArgument(f"That regex can't be combined with the other filter regexes: {e}")
+
         fw = FilterWord()
         fw.bypass = bypass
         fw.notify = notify
         fw.word = phrase
+        fw.mode = mode
+        fw.shadow = shadow
 
         await self.bot.settings.add_filtered_word(fw)
 
         phrase = discord.utils.escape_markdown(phrase)
         phrase = discord.utils.escape_mentions(phrase)
 
-        await ctx.message.reply(f"Added new word to filter! This filter {'will' if notify else 'will not'} ping for reports, level {bypass} can bypass it, and the phrase is {phrase}")
+        if shadow:
+            await ctx.message.reply(f"Added new word to filter in shadow mode, matches will only be logged and counted in `!filterlist`. Level {bypass} can bypass it, it matches as {mode}, and the phrase is {phrase}")
+            return
+
+        await ctx.message.reply(f"Added new word to filter! This filter {'will' if notify else 'will not'} ping for reports, level {bypass} can bypass it, it matches as {mode}, and the phrase is {phrase}")
+        self.sweep_nicknames(ctx, fw)
+
+    def sweep_nicknames(self, ctx, fw: FilterWord) -> None:
+        # rename existing members whose nickname contains the new word
+        monitor = self.bot.get_cog("FilterMonitor")
+        if monitor is not None:
+            self.bot.loop.create_task(monitor.sweep_nicknames([fw], ctx.channel))
 
     @commands.guild_only()
     @commands.command(name="filterlist")
@@ -122,6 +211,32 @@ class Filters(commands.Cog):
 
         await menus.start(ctx)
 
+    @commands.guild_only()
+    @commands.command(name="filterstats")
+    async def filterstats(self, ctx):
+        """Show how often each message filter ran, how often it filtered a message, and how long it took (admin only)
+
+        """
+
+        if not self.bot.settings.permissions.hasAtLeast(ctx.guild, ctx.author, 6):
+            await ctx.message.delete()
+            raise commands.BadArgument(
+                "You need to be an administator or higher to use that command.")
+
+        embed = discord.Embed(title="Filter statistics", color=discord.Color.blurple())
+        for stage in self.bot.filters.stages:
+            average = stage.total_time / stage.calls * 1000 if stage.calls else 0
+            embed.add_field(name=stage.name,
+                            value=f"Ran {stage.calls} times, filtered {stage.hits}\nAverage {average:.2f}ms, max {stage.max_time * 1000:.2f}ms")
+        verdicts = self.bot.settings.word_filter().verdict.cache_info()
+        embed.add_field(name="Verdict cache", value=f"{verdicts.hits} hits, {verdicts.misses} misses, {verdicts.currsize} cached (since the filter list last changed)", inline=False)
+        monitor = self.bot.get_cog("FilterMonitor")
+        if monitor is not None:
+            embed.add_field(name="Edits", value=f"{monitor.edits_filtered} re-filtered, {monitor.edits_skipped} skipped (content unchanged)", inline=False)
+        embed.set_footer(text="Filters run in this order and stop at the first one that filters the message.")
+
+        await ctx.message.reply(embed=embed)
+
     @commands.guild_only()
     @commands.command(name="piracy")
     async def piracy(self, ctx, *, word: str):
@@ -158,6 +273,44 @@ class Filters(commands.Cog):
             await ctx.message.reply("That word is not filtered.", delete_after=5)            
         await ctx.message.delete(delay=5)
 
+    @commands.guild_only()
+    @commands.command(name="shadow")
+    async def shadow(self, ctx, *, word: str):
+        """Toggle shadow mode of a filtered word. Shadow words only log and count their matches (admin only)
+
+        Example usage:
+        --------------
+        `!shadow xd xd xd`
+
+        Parameters
+        ----------
+        word : str
+            Word to toggle shadow mode for
+
+        """
+        # must be at least admin
+        if not self.bot.settings.permissions.hasAtLeast(ctx.guild, ctx.author, 6):
+            await ctx.message.delete()
+            raise commands.BadArgument(
+                "You need to be an administator or higher to use that command.")
+
+        words = self.bot.settings.guild().filter_words
+        words = list(filter(lambda w: w.word.lower() == word.lower(), words))
+
+        if len(words) > 0:
+            await self.bot.settings.remove_filtered_word(words[0].word)
+            words[0].shadow = not words[0].shadow
+            await self.bot.settings.add_filtered_word(words[0])
+
+            if words[0].shadow:
+                await ctx.message.reply("That word is now in shadow mode, matches will only be logged.", delete_after=5)
+            else:
+                await ctx.message.reply("That word is now live!", delete_after=5)
+                self.sweep_nicknames(ctx, words[0])
+        else:
+            await ctx.message.reply("That word is not filtered.", delete_after=5)
+        await ctx.message.delete(delay=5)
+
     @commands.guild_only()
     @commands.command(name="filterremove")
     async def filterremove(self, ctx, *, word: str):
@@ -309,6 +462,9 @@ class Filters(commands.Cog):
     @filterremove.error
     @filteradd.error
     @filterlist.error
+    @filterstats.error
+    @filtershadow.error
+    @shadow.error
     @offlineping.error
     @ignorechannel.error
     @unignorechannel.error
@@ -78,14 +78,11 @@ class ModActions(commands.Cog):
                 raise commands.BadArgument(
                     f"Couldn't find user with ID {user}")
 
-        guild = self.bot.settings.guild()
-
         reason = discord.utils.escape_markdown(reason)
         reason = discord.utils.escape_mentions(reason)
 
         # prepare the case object for database
         case = Case(
-            _id=guild.case_id,
             _type="WARN",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
@@ -93,15 +90,10 @@ class ModActions(commands.Cog):
             punishment=str(points)
         )
 
-        # increment case ID in database for next available case ID
-        await self.bot.settings.inc_caseid()
         # add new case to DB
         await self.bot.settings.add_case(user.id, case)
-        # add warnpoints to the user in DB
-        await self.bot.settings.inc_points(user.id, points)
-
-        # fetch latest document about user from DB
-        results = await self.bot.settings.user(user.id)
+        # add warnpoints to the user in DB, and get the updated document back
+        results = await self.bot.settings.inc_points(user.id, points)
         cur_points = results.warn_points
 
         # prepare log embed, send to #public-mod-logs, user, channel where invoked
@@ -179,8 +171,7 @@ class ModActions(commands.Cog):
         await self.check_permissions(ctx, user)
 
         # retrieve user's case with given ID
-        cases = await self.bot.settings.get_case(user.id, case_id)
-        case = cases.cases.filter(_id=case_id).first()
+        case = await self.bot.settings.get_case(user.id, case_id)
 
         reason = discord.utils.escape_markdown(reason)
         reason = discord.utils.escape_mentions(reason)
@@ -207,7 +198,7 @@ class ModActions(commands.Cog):
         case.lifted_by_tag = str(ctx.author)
         case.lifted_by_id = ctx.author.id
         case.lifted_date = datetime.datetime.now()
-        cases.save()
+        await self.bot.settings.save(case)
 
         # remove the warn points from the user in DB
         await self.bot.settings.inc_points(user.id, -1 * int(case.punishment))
@@ -267,7 +258,6 @@ class ModActions(commands.Cog):
         await self.bot.settings.inc_points(user.id, -1 * points)
 
         case = Case(
-            _id=self.bot.settings.guild().case_id,
             _type="REMOVEPOINTS",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
@@ -275,8 +265,6 @@ class ModActions(commands.Cog):
             reason=reason,
         )
 
-        # increment DB's max case ID for next case
-        await self.bot.settings.inc_caseid()
         # add case to db
         await self.bot.settings.add_case(user.id, case)
 
@@ -381,15 +369,12 @@ class ModActions(commands.Cog):
     async def add_kick_case(self, ctx, user, reason):
         # prepare case for DB
         case = Case(
-            _id=self.bot.settings.guild().case_id,
             _type="KICK",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
             reason=reason,
         )
 
-        # increment max case ID for next case
-        await self.bot.settings.inc_caseid()
         # add new case to DB
         await self.bot.settings.add_case(user.id, case)
 
@@ -453,7 +438,6 @@ class ModActions(commands.Cog):
     async def add_ban_case(self, ctx, user, reason):
         # prepare the case to store in DB
         case = Case(
-            _id=self.bot.settings.guild().case_id,
             _type="BAN",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
@@ -461,8 +445,6 @@ class ModActions(commands.Cog):
             reason=reason,
         )
 
-        # increment DB's max case ID for next case
-        await self.bot.settings.inc_caseid()
         # add case to db
         await self.bot.settings.add_case(user.id, case)
         # prepare log embed to send to #public-mod-logs, user and context
@@ -503,13 +485,11 @@ class ModActions(commands.Cog):
             raise commands.BadArgument(f"{user} is not banned.")
 
         case = Case(
-            _id=self.bot.settings.guild().case_id,
             _type="UNBAN",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
             reason=reason,
         )
-        await self.bot.settings.inc_caseid()
         await self.bot.settings.add_case(user.id, case)
 
         log = await logging.prepare_unban_log(ctx.author, user, case)
@@ -594,7 +574,6 @@ class ModActions(commands.Cog):
             raise commands.BadArgument("This user is already muted.")
 
         case = Case(
-            _id=self.bot.settings.guild().case_id,
             _type="MUTE",
             date=now,
             mod_id=ctx.author.id,
@@ -615,11 +594,10 @@ class ModActions(commands.Cog):
         else:
             case.punishment = "PERMANENT"
 
-        await self.bot.settings.inc_caseid()
         await self.bot.settings.add_case(user.id, case)
         u = await self.bot.settings.user(id=user.id)
         u.is_muted = True
-        u.save()
+        await self.bot.settings.save(u)
 
         await user.add_roles(mute_role)
 
@@ -668,7 +646,7 @@ class ModActions(commands.Cog):
 
         u = await self.bot.settings.user(id=user.id)
         u.is_muted = False
-        u.save()
+        await self.bot.settings.save(u)
 
         try:
             self.bot.settings.tasks.cancel_unmute(user.id)
@@ -676,13 +654,11 @@ class ModActions(commands.Cog):
             pass
 
         case = Case(
-            _id=self.bot.settings.guild().case_id,
             _type="UNMUTE",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
             reason=reason,
         )
-        await self.bot.settings.inc_caseid()
         await self.bot.settings.add_case(user.id, case)
 
         log = await logging.prepare_unmute_log(ctx.author, user, case)
@@ -6,7 +6,37 @@ import humanize
 
 import discord
 from data.case import Case
-from discord.ext import commands
+from discord.ext import commands, menus
+
+
+class ModCasesSource(menus.ListPageSource):
+    """Pages through the cases a moderator handled, 10 per page to stay well below the embed size limit.
+    """
+
+    def __init__(self, cases, mod, days):
+        super().__init__(cases, per_page=10)
+        self.mod = mod
+        self.days = days
+
+    async def format_page(self, menu, entry):
+        embed = discord.Embed(title=f"Cases by {self.mod} in the last {self.days} days")
+        embed.color = discord.Color.blurple()
+        embed.description = f"{len(self.entries)} cases in total"
+        for case in entry:
+            embed.add_field(name=f"{case._type} - Case #{case._id}",
+                            value=f"<@{case.user_id}> - {case.reason[0:200]} - {humanize.naturaltime(datetime.datetime.now() - case.date)}", inline=False)
+        embed.set_footer(text=f"Page {menu.current_page +1} of {self.get_max_pages()}")
+        return embed
+
+
+class MenuPages(menus.MenuPages):
+    async def update(self, payload):
+        if self._can_remove_reactions:
+            if payload.event_type == 'REACTION_ADD':
+                await self.message.remove_reaction(payload.emoji, payload.member)
+            elif payload.event_type == 'REACTION_REMOVE':
+                return
+        await super().update(payload)
 
 
 class ModUtils(commands.Cog):
@@ -34,6 +64,37 @@ class ModUtils(commands.Cog):
 
         await ctx.message.reply(embed=await self.prepare_rundown_embed(ctx, user))
 
+    @commands.guild_only()
+    @commands.command(name="modcases")
+    async def modcases(self, ctx: commands.Context, mod: discord.Member, days: int = 7) -> None:
+        """Show the cases a moderator handled recently (mod only)
+
+        Example usage:
+        --------------
+        `!modcases <@mod/ID> <days (optional)>`
+
+        Parameters
+        ----------
+        mod : discord.Member
+            The moderator whose cases to show
+        days : int, optional
+            How many days back to look, by default 7
+        """
+
+        if not self.bot.settings.permissions.hasAtLeast(ctx.guild, ctx.author, 5):
+            raise commands.BadArgument(
+                "You need to be at least a Moderator to use that command.")
+        if days < 1:
+            raise commands.BadArgument("Days can't be lower than 1.")
+
+        since = datetime.datetime.now() - datetime.timedelta(days=days)
+        cases = await self.bot.settings.cases_by_mod(mod.id, since)
+        if not cases:
+            raise commands.BadArgument(f"{mod.mention} handled no cases in the last {days} days.")
+
+        menus = MenuPages(source=ModCasesSource(cases, mod, days), clear_reactions_after=True)
+        await menus.start(ctx)
+
     @commands.guild_only()
     @commands.command(name="transferprofile")
     async def transferprofile(self, ctx, oldmember: typing.Union[int, discord.Member], newmember: discord.Member):
@@ -111,10 +172,9 @@ class ModUtils(commands.Cog):
         results.is_clem = True
         results.is_xp_frozen = True
         results.warn_points = 599
-        results.save()
+        await self.bot.settings.save(results)
 
         case = Case(
-            _id=self.bot.settings.guild().case_id,
             _type="CLEM",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
@@ -122,8 +182,6 @@ class ModUtils(commands.Cog):
             reason="No reason."
         )
 
-        # increment DB's max case ID for next case
-        await self.bot.settings.inc_caseid()
         # add case to db
         await self.bot.settings.add_case(user.id, case)
 
@@ -154,7 +212,7 @@ class ModUtils(commands.Cog):
 
         results = await self.bot.settings.user(user.id)
         results.is_music_banned = True
-        results.save()
+        await self.bot.settings.save(results)
         
         await ctx.send("Done", delete_after=5)
 
@@ -184,7 +242,7 @@ class ModUtils(commands.Cog):
         results = await self.bot.settings.user(user.id)
         results.birthday_excluded = True
         results.birthday = None
-        results.save()
+        await self.bot.settings.save(results)
 
         birthday_role = ctx.guild.get_role(self.bot.settings.guild().role_birthday)
         if birthday_role is None:
@@ -220,7 +278,7 @@ class ModUtils(commands.Cog):
 
         results = await self.bot.settings.user(user.id)
         results.birthday = None
-        results.save()
+        await self.bot.settings.save(results)
 
         try:
             self.bot.settings.tasks.cancel_unbirthday(user.id)
@@ -272,7 +330,7 @@ class ModUtils(commands.Cog):
 
         results = await self.bot.settings.user(user.id)
         results.birthday = [month, date]
-        results.save()
+        await self.bot.settings.save(results)
 
         await ctx.message.reply(f"{user.mention}'s birthday was set.", allowed_mentions=discord.AllowedMentions(everyone=False, users=False, roles=False), delete_after=5)
         await ctx.message.delete(delay=5)
@@ -360,6 +418,7 @@ class ModUtils(commands.Cog):
     @removebirthday.error
     @setbirthday.error
     @transferprofile.error
+    @modcases.error
     @rundown.error
     @clem.error
     async def info_error(self, ctx, error):
@@ -87,7 +87,7 @@ class Birthday(commands.Cog):
                 "You already have a birthday set! You need to ask a mod to change it.")
 
         results.birthday = [month, date]
-        results.save()
+        await self.bot.settings.save(results)
 
         await ctx.message.reply(f"{user.mention}'s birthday was set.", allowed_mentions=discord.AllowedMentions(everyone=False, users=False, roles=False), delete_after=5)
         await ctx.message.delete(delay=5)
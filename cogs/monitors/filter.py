@@ -1,17 +1,68 @@
-import string
+import asyncio
 import traceback
 
 import discord
-from discord.ext import commands
-from fold_to_ascii import fold
+from cogs.utils.loops import keep_running
+from cogs.utils.normalize import normalize_cached
+from cogs.utils.wordfilter import CompiledFilter
+from discord.ext import commands, tasks
+
+# seconds between two nickname edits of a sweep, to stay well below the member edit rate limit
+SWEEP_EDIT_DELAY = 1.0
+# how many members to check before yielding to the event loop
+SWEEP_CHUNK_SIZE = 500
+
+
+class NickSweep:
+    """Progress of one nickname sweep, reported by editing `message`.
+    """
+
+    def __init__(self, message: discord.Message, words: list):
+        self.message = message
+        self.words = words
+        self.checked = 0
+        self.queued = 0
+        self.renamed = 0
+        self.done = 0
+        self.scanning = True
+
+    def status(self) -> str:
+        words = ", ".join(f"`{word.word}`" for word in self.words)
+        if self.scanning:
+            return f"Checking nicknames for {words}: {self.checked} members checked, {self.queued} to rename..."
+        if self.done < self.queued:
+            return f"Checking nicknames for {words}: {self.checked} members checked, renaming {self.done}/{self.queued}..."
+        return f"Checked {self.checked} nicknames for {words}, renamed {self.renamed} members."
 
 
 class FilterMonitor(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # edits that didn't change anything the filters look at (i.e embeds unfurling), and edits that did
+        self.edits_skipped = 0
+        self.edits_filtered = 0
+        # (member ID, NickSweep) of members whose nickname a sweep found, renamed one at a time by `rename_worker`
+        self.rename_queue = asyncio.Queue()
+        self.rename_task = self.bot.loop.create_task(self.rename_worker())
+        self.flush_hits.start()
+
+    def cog_unload(self):
+        self.rename_task.cancel()
+        self.flush_hits.cancel()
+
+    @tasks.loop(seconds=60)
+    @keep_running
+    async def flush_hits(self):
+        # counts that fail to write are put back and retried by the next flush
+        await self.bot.settings.flush_filter_hits()
 
     @commands.Cog.listener()
-    async def on_message_edit(self, _: discord.Message, after: discord.Message):
+    async def on_message_edit(self, before: discord.Message, after: discord.Message):
+        if before.content == after.content and before.attachments == after.attachments:
+            self.edits_skipped += 1
+            return
+
+        self.edits_filtered += 1
         await self.bot.filter(after)
 
     @commands.Cog.listener()
@@ -36,23 +87,82 @@ class FilterMonitor(commands.Cog):
         if member.guild.id != self.bot.settings.guild_id:
             return
 
-        guild = self.bot.settings.guild()
-        nick = member.display_name
-
-        symbols = (u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
-                   u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
-
-        tr = {ord(a): ord(b) for a, b in zip(*symbols)}
-
-        folded_message = fold(nick.translate(tr).lower()).lower()
-        folded_without_spaces = "".join(folded_message.split())
-        folded_without_spaces_and_punctuation = folded_without_spaces.translate(str.maketrans('', '', string.punctuation))
+        if self.offending_word(member, self.bot.settings.word_filter()) is not None:
+            await member.edit(nick="change name pls", reason=f"filter triggered ({member.display_name})")
+
+    def offending_word(self, member: discord.Member, word_filter: CompiledFilter):
+        """The first filtered word in the member's display name that they can't bypass, or None.
+        """
+
+        folded_message, _, folded_without_spaces_and_punctuation = normalize_cached(member.display_name)
+        if not folded_message:
+            return None
+
+        hits = word_filter.find(folded_message) | word_filter.find(folded_without_spaces_and_punctuation)
+        for i in sorted(hits):
+            word = word_filter.words[i]
+            if not word.shadow and not self.bot.settings.permissions.hasAtLeast(member.guild, member, word.bypass):
+                return word
+        return None
+
+    async def sweep_nicknames(self, words: list, channel: discord.TextChannel) -> None:
+        """Check the display names of all members against newly filtered words, and queue the offenders
+        to be renamed. Only the new words are checked, since every name was already checked against the rest.
+
+        Parameters
+        ----------
+        words : list
+            The FilterWord objects that were just added to the filter
+        channel : discord.TextChannel
+            Channel to report progress in
+        """
+
+        guild = self.bot.get_guild(self.bot.settings.guild_id)
+        if guild is None:
+            return
 
-        if folded_message:
-            for word in guild.filter_words:
-                if not self.bot.settings.permissions.hasAtLeast(member.guild, member, word.bypass):
-                    if (word.word.lower() in folded_message or word.word.lower() in folded_without_spaces_and_punctuation):
-                        await member.edit(nick="change name pls", reason=f"filter triggered ({nick})")
+        sweep = NickSweep(await channel.send("Checking nicknames..."), words)
+        word_filter = CompiledFilter(words, cache_size=0)
+
+        for member in list(guild.members):
+            if self.offending_word(member, word_filter) is not None:
+                sweep.queued += 1
+                await self.rename_queue.put((member.id, sweep))
+            sweep.checked += 1
+            if sweep.checked % SWEEP_CHUNK_SIZE == 0:
+                await asyncio.sleep(0)
+
+        sweep.scanning = False
+        await self.report_sweep(sweep)
+
+    async def rename_worker(self):
+        await self.bot.wait_until_ready()
+        while True:
+            id, sweep = await self.rename_queue.get()
+            guild = self.bot.get_guild(self.bot.settings.guild_id)
+            member = guild.get_member(id) if guild is not None else None
+
+            try:
+                # the member may have left or changed their name since the sweep found them
+                if member is not None and self.offending_word(member, self.bot.settings.word_filter()) is not None:
+                    try:
+                        await member.edit(nick="change name pls", reason=f"filter triggered ({member.display_name})")
+                        sweep.renamed += 1
+                    except discord.HTTPException:
+                        pass
+                    await asyncio.sleep(SWEEP_EDIT_DELAY)
+
+                sweep.done += 1
+                if sweep.done % 10 == 0 or (sweep.done == sweep.queued and not sweep.scanning):
+                    await self.report_sweep(sweep)
+            except Exception:
+                traceback.print_exc()
+
+    async def report_sweep(self, sweep: NickSweep):
+        try:
+            await sweep.message.edit(content=sweep.status())
+        except discord.HTTPException:
+            pass
 
    
     async def info_error(self, ctx, error):
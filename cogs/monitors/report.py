@@ -1,59 +1,112 @@
 import asyncio
 import datetime
+import os
+import traceback
+from collections import deque
 
 import discord
 import humanize
+from cogs.utils.loops import keep_running
+from data.report import Report
+from discord.ext import commands, tasks
+
+REPORT_REACTIONS = ['✅', '🆔', '🧹']
+# how long moderators can act on a report through its reactions
+REPORT_TIMEOUT = datetime.timedelta(seconds=120)
+# further hits from a user within this many seconds of their report are added to that report instead of making a new one
+REPORT_COALESCE_WINDOW = datetime.timedelta(seconds=int(os.environ.get("BOTTY_REPORT_COALESCE", 60)))
+# how long to wait before editing a coalesced report, so that a burst of hits costs one edit
+REPORT_EDIT_DELAY = 2
+# Discord's limit on the length of an embed field's value
+FIELD_LIMIT = 1024
+
+
+class CoalescedReport:
+    """The report that was most recently sent for a user, and the hits that were added to it since.
+    """
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.created = datetime.datetime.now()
+        self.message = None
+        self.embed = None
+        self.hits = 0
+        self.excerpts = deque(maxlen=3)
+        self.edit_task = None
+
+
+# user ID -> CoalescedReport
+recent_reports = {}
 
 
 async def report(bot, msg, user, word, invite=None):
-    role = msg.guild.get_role(bot.settings.guild().role_moderator)
-    channel = msg.guild.get_channel(bot.settings.guild().channel_reports)
+    entry = recent_reports.get(user.id)
+    if entry is None or datetime.datetime.now() - entry.created > REPORT_COALESCE_WINDOW:
+        entry = recent_reports[user.id] = CoalescedReport()
 
-    ping_string = ""
-    for member in role.members:
-        offline_ping = (await bot.settings.user(member.id)).offline_report_ping
-        if member.status == discord.Status.online or offline_ping:
-            ping_string += f"{member.mention} "
+    async with entry.lock:
+        entry.hits += 1
+        entry.excerpts.append(excerpt(msg, word))
 
-    embed = await prepare_embed(bot, user, msg, word)
+        if entry.message is not None:
+            if entry.edit_task is None:
+                entry.edit_task = bot.loop.create_task(edit_report(user.id, entry))
+            return
 
-    if invite:
-        report_msg = await channel.send(f"{ping_string}\nMessage contained invite: {invite}", embed=embed)
-    else:
-        report_msg = await channel.send(ping_string, embed=embed)
-    report_reactions = ['✅', '🆔', '🧹']
+        role = msg.guild.get_role(bot.settings.guild().role_moderator)
+        channel = msg.guild.get_channel(bot.settings.guild().channel_reports)
 
-    for reaction in report_reactions:
-        await report_msg.add_reaction(reaction)
+        offline_pings = bot.settings.offline_pings
+        ping_string = "".join(f"{member.mention} " for member in role.members
+                              if member.status == discord.Status.online or member.id in offline_pings)
 
-    def check(reaction, user):
-        res = (user.id != bot.user.id
-               and reaction.message == report_msg
-               and str(reaction.emoji) in report_reactions
-               and bot.settings.permissions.hasAtLeast(user.guild, user, 5))
-        return res
+        entry.embed = await prepare_embed(bot, user, msg, word)
 
-    while True:
-        try:
-            reaction, _ = await bot.wait_for('reaction_add', timeout=120.0, check=check)
-        except asyncio.TimeoutError:
-            try:
-                await report_msg.clear_reactions()
-                return
-            except Exception:
-                pass
+        if invite:
+            entry.message = await channel.send(f"{ping_string}\nMessage contained invite: {invite}", embed=entry.embed)
         else:
-            if str(reaction.emoji) == '✅':
-                try:
-                    await report_msg.delete()
-                except Exception:
-                    pass
-                return
-            elif str(reaction.emoji) == '🆔':
-                await channel.send(user.id, delete_after=10)
-            elif str(reaction.emoji) == '🧹':
-                await channel.purge(limit=100)
-            
+            entry.message = await channel.send(ping_string, embed=entry.embed)
+
+        for reaction in REPORT_REACTIONS:
+            await entry.message.add_reaction(reaction)
+
+        # reactions are handled by the ReportActions cog
+        await bot.settings.add_report(Report(_id=entry.message.id, channel_id=channel.id, user_id=user.id,
+                                             expires=datetime.datetime.now() + REPORT_TIMEOUT))
+
+
+def excerpt(msg, word):
+    content = msg.content if len(msg.content) <= 150 else msg.content[0:150] + "..."
+    return f"{discord.utils.escape_markdown(content)}\n[Link to message]({msg.jump_url}) | Filtered word: **{word}**"
+
+
+async def edit_report(user_id, entry):
+    """Update a coalesced report with its hit count and the latest messages that were filtered,
+    after waiting a bit for more hits to come in.
+    """
+
+    await asyncio.sleep(REPORT_EDIT_DELAY)
+    async with entry.lock:
+        entry.edit_task = None
+
+        # show as many of the latest excerpts as fit in the field
+        excerpts = list(entry.excerpts)
+        while len(excerpts) > 1 and len("\n\n".join(excerpts)) > FIELD_LIMIT:
+            excerpts.pop(0)
+        value = "\n\n".join(excerpts)
+        if len(value) > FIELD_LIMIT:
+            value = value[0:FIELD_LIMIT - 3] + "..."
+
+        entry.embed.set_field_at(2, name=f"Messages ({entry.hits} hits, latest {len(excerpts)} shown)",
+                                 value=value, inline=False)
+        try:
+            await entry.message.edit(embed=entry.embed)
+        except discord.NotFound:
+            # the report was dismissed, the next hit makes a new one
+            if recent_reports.get(user_id) is entry:
+                del recent_reports[user_id]
+        except discord.HTTPException:
+            traceback.print_exc()
 
 
 async def prepare_embed(bot, user, msg, word):
@@ -106,3 +159,71 @@ async def prepare_embed(bot, user, msg, word):
         embed.set_footer(text="React with ✅ to dismiss.")
 
     return embed
+
+
+class ReportActions(commands.Cog):
+    """Handles the reactions on all open reports, see `report()`. Open reports are looked up
+    by message ID in `Settings.reports`, so one listener serves every report.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.expire_reports.start()
+
+    def cog_unload(self):
+        self.expire_reports.cancel()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        report = self.bot.settings.reports.get(payload.message_id)
+        if report is None or payload.user_id == self.bot.user.id:
+            return
+        if str(payload.emoji) not in REPORT_REACTIONS or payload.member is None:
+            return
+        if not self.bot.settings.permissions.hasAtLeast(payload.member.guild, payload.member, 5):
+            return
+
+        channel = self.bot.get_channel(report.channel_id)
+        if channel is None:
+            return
+
+        if str(payload.emoji) == '✅':
+            await self.bot.settings.remove_report(report._id)
+            entry = recent_reports.get(report.user_id)
+            if entry is not None and entry.message is not None and entry.message.id == report._id:
+                del recent_reports[report.user_id]
+            try:
+                await channel.get_partial_message(report._id).delete()
+            except Exception:
+                pass
+        elif str(payload.emoji) == '🆔':
+            await channel.send(report.user_id, delete_after=10)
+        elif str(payload.emoji) == '🧹':
+            await channel.purge(limit=100)
+
+    @tasks.loop(seconds=10)
+    @keep_running
+    async def expire_reports(self):
+        now = datetime.datetime.now()
+        for user_id in [user_id for user_id, entry in recent_reports.items() if now - entry.created > REPORT_COALESCE_WINDOW]:
+            del recent_reports[user_id]
+
+        for report in [report for report in self.bot.settings.reports.values() if report.expires <= now]:
+            # one failing report must not keep the others from expiring
+            try:
+                await self.bot.settings.remove_report(report._id)
+                channel = self.bot.get_channel(report.channel_id)
+                if channel is not None:
+                    await channel.get_partial_message(report._id).clear_reactions()
+            except discord.HTTPException:
+                pass
+            except Exception:
+                traceback.print_exc()
+
+    @expire_reports.before_loop
+    async def before_expire_reports(self):
+        await self.bot.wait_until_ready()
+
+
+def setup(bot):
+    bot.add_cog(ReportActions(bot))
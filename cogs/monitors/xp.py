@@ -1,14 +1,56 @@
-import math
+import asyncio
 import traceback
 from random import randint
 
 import discord
-from discord.ext import commands
+from cogs.utils.leveling import level_for_xp
+from cogs.utils.loops import keep_running
+from discord.ext import commands, tasks
 
 
 class Xp(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # user ID -> [xp, level, frozen], the user's XP as of the last DB read plus everything gained since
+        self.xp_state = {}
+        # user ID -> [xp, levels] gained since the last flush, not written to the database yet
+        self.pending = {}
+        # held while flushing and while rebuilding a user's state from the database, so that a rebuild
+        # never reads a document that may or may not include a batch that is being written
+        self.flush_lock = asyncio.Lock()
+        self.flush_loop.start()
+
+    def cog_unload(self):
+        self.flush_loop.cancel()
+        self.bot.loop.create_task(self.flush())
+
+    @tasks.loop(seconds=5)
+    @keep_running
+    async def flush_loop(self):
+        # a batch that fails to write is put back and retried by the next flush
+        await self.flush()
+
+    async def flush(self):
+        """Write all buffered XP and level increments to the database in one bulk write.
+        The in-memory XP state is dropped as well so that it gets reloaded from the database,
+        picking up any changes made elsewhere (clem, XP freezes, profile transfers).
+        """
+
+        async with self.flush_lock:
+            flushing, self.pending = self.pending, {}
+            self.xp_state = {}
+            if not flushing:
+                return
+
+            try:
+                await self.bot.settings.bulk_inc_xp(flushing)
+            except Exception:
+                # put the batch back so that the next flush writes it
+                for id, (xp, levels) in flushing.items():
+                    pending = self.pending.setdefault(id, [0, 0])
+                    pending[0] += xp
+                    pending[1] += levels
+                raise
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member) -> None:
@@ -40,17 +82,30 @@ class Xp(commands.Cog):
         if message.author.bot:
             return
 
-        user = await self.bot.settings.user(id=message.author.id)
+        state = self.xp_state.get(message.author.id)
+        if state is None:
+            async with self.flush_lock:
+                state = self.xp_state.get(message.author.id)
+                if state is None:
+                    user = await self.bot.settings.user(id=message.author.id)
+                    # include whatever was gained but not written to the database yet
+                    xp, levels = self.pending.get(message.author.id, (0, 0))
+                    state = [user.xp + xp, user.level + levels, user.is_xp_frozen or user.is_clem]
+                    self.xp_state[message.author.id] = state
+
         db = self.bot.settings.guild()
-        if user.is_xp_frozen or user.is_clem:
+        if state[2]:
             return
 
         xp_to_add = randint(0, 11)
-        new_xp, level_before = await self.bot.settings.inc_xp(message.author.id, xp_to_add)
-        new_level = await self.get_level(new_xp)
+        pending = self.pending.setdefault(message.author.id, [0, 0])
+        pending[0] += xp_to_add
+        state[0] += xp_to_add
+        new_level = await self.get_level(state[0])
 
-        if new_level > level_before:
-            await self.bot.settings.inc_level(message.author.id)
+        if new_level > state[1]:
+            pending[1] += 1
+            state[1] += 1
 
         roles_to_add = await self.assess_new_roles(new_level, db)
         await self.add_new_roles(message, roles_to_add)
@@ -81,12 +136,7 @@ class Xp(commands.Cog):
                         await obj.add_roles(role)
 
     async def get_level(self, current_xp):
-        level = 0
-        xp = 0
-        while xp <= current_xp:
-            xp = xp + 45 * level * (math.floor(level / 10) + 1)
-            level += 1
-        return level
+        return level_for_xp(current_xp)
 
     async def info_error(self, ctx, error):
         if (isinstance(error, commands.MissingRequiredArgument)
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """A size-bounded LRU cache whose entries also expire after a fixed amount of time.
+    Keeps count of hits and misses.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """Initialize the cache.
+
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of entries, the least recently used entry is evicted when it's full
+        ttl : float
+            Number of seconds an entry stays valid after it was stored
+        """
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the cached value for `key`, or None if there is no valid entry.
+        """
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl: float = None) -> None:
+        """Store `value` under `key`, evicting the least recently used entry if the cache is full.
+        `ttl` overrides the cache's TTL for this entry.
+        """
+
+        self.entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key) -> None:
+        """Remove the entry for `key`, if there is one.
+        """
+
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
@@ -0,0 +1,100 @@
+import time
+
+import discord
+from cogs.utils.normalize import Normalized, normalize_cached
+from data.guild import Guild
+
+
+class FilterContext:
+    """Everything the message filters need to know about a message, computed once per message
+    instead of once per filter.
+    """
+
+    def __init__(self, message: discord.Message, guild: Guild, level: int):
+        """Build the context of a message.
+
+        Parameters
+        ----------
+        message : discord.Message
+            The message being filtered
+        guild : Guild
+            Snapshot of the main guild's Guild document
+        level : int
+            The author's permission level
+        """
+
+        self.message = message
+        self.guild = guild
+        self.level = level
+        self.normalized: Normalized = normalize_cached(message.content)
+
+    def has_dev_role(self) -> bool:
+        dev_role = self.message.guild.get_role(self.guild.role_dev)
+        return dev_role is not None and dev_role in self.message.author.roles
+
+
+class FilterStage:
+    """One filter in the pipeline, and statistics about how it has been doing.
+    """
+
+    def __init__(self, name: str, func):
+        """Create a stage.
+
+        Parameters
+        ----------
+        name : str
+            Name shown in the statistics
+        func : coroutine function
+            Takes a FilterContext and returns True if it filtered the message
+        """
+
+        self.name = name
+        self.func = func
+        self.calls = 0
+        self.hits = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class FilterPipeline:
+    """Runs a message through filter stages in order, stopping at the first stage that filters it.
+    """
+
+    def __init__(self, stages: list):
+        """Create the pipeline.
+
+        Parameters
+        ----------
+        stages : list
+            (name, coroutine function) pairs, in the order they should run
+        """
+
+        self.stages = [FilterStage(name, func) for name, func in stages]
+
+    async def run(self, ctx: FilterContext) -> bool:
+        """Run the message through every stage until one of them filters it.
+
+        Parameters
+        ----------
+        ctx : FilterContext
+            The message's context
+
+        Returns
+        -------
+        bool
+            True if the message was filtered
+        """
+
+        for stage in self.stages:
+            start = time.perf_counter()
+            try:
+                hit = await stage.func(ctx)
+            finally:
+                elapsed = time.perf_counter() - start
+                stage.calls += 1
+                stage.total_time += elapsed
+                stage.max_time = max(stage.max_time, elapsed)
+            if hit:
+                stage.hits += 1
+                return True
+        return False
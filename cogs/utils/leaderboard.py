@@ -0,0 +1,52 @@
+import bisect
+
+
+class LeaderboardIndex:
+    """In-memory ranking of all users by XP, kept as a sorted list of (xp, user ID) pairs.
+    Rank and top-N lookups are a bisect or a slice instead of a scan over the users collection.
+    The ordering matches the database's: highest XP first, ties broken by highest user ID first.
+    """
+
+    def __init__(self, users):
+        """Seed the index.
+
+        Parameters
+        ----------
+        users : iterable
+            (user ID, xp) pairs for every user in the database
+        """
+
+        self.xp = dict(users)
+        self.ranking = sorted((xp, id) for id, xp in self.xp.items())
+
+    def __len__(self):
+        return len(self.ranking)
+
+    def set(self, id: int, xp: int) -> None:
+        """Set the XP of user `id`, adding them to the index if they weren't in it yet.
+        """
+
+        old = self.xp.get(id)
+        if old is not None:
+            i = bisect.bisect_left(self.ranking, (old, id))
+            del self.ranking[i]
+        self.xp[id] = xp
+        bisect.insort(self.ranking, (xp, id))
+
+    def add(self, id: int, xp: int) -> None:
+        """Increment the XP of user `id` by `xp`.
+        """
+
+        self.set(id, self.xp.get(id, 0) + xp)
+
+    def rank(self, xp: int) -> int:
+        """The number of users that have at least `xp` XP, which is the rank of a user with `xp` XP.
+        """
+
+        return len(self.ranking) - bisect.bisect_left(self.ranking, (xp,))
+
+    def top(self, n: int) -> list:
+        """The IDs of the `n` users with the most XP, highest first.
+        """
+
+        return [id for _, id in reversed(self.ranking[-n:])] if n > 0 else []
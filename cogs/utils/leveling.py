@@ -0,0 +1,81 @@
+import bisect
+
+import numpy as np
+
+# THRESHOLDS[n] is the total amount of XP it takes to get to level n.
+# Every level costs 45 * level XP, times one more for every 10 levels.
+THRESHOLDS = [0]
+
+
+def _extend(level: int) -> None:
+    """Grow the threshold table so that it covers at least `level`.
+    """
+
+    while len(THRESHOLDS) <= level:
+        n = len(THRESHOLDS) - 1
+        THRESHOLDS.append(THRESHOLDS[-1] + 45 * n * (n // 10 + 1))
+
+
+_extend(1000)
+_thresholds_array = np.array(THRESHOLDS, dtype=np.int64)
+
+
+def xp_for_level(level: int) -> int:
+    """Total XP needed to reach level `level`.
+
+    Parameters
+    ----------
+    level : int
+        The level
+
+    Returns
+    -------
+    int
+        The XP threshold of that level
+    """
+
+    _extend(level)
+    return THRESHOLDS[level]
+
+
+def level_for_xp(xp: int) -> int:
+    """The level a user with `xp` XP is at.
+
+    Parameters
+    ----------
+    xp : int
+        The user's XP
+
+    Returns
+    -------
+    int
+        The user's level
+    """
+
+    while THRESHOLDS[-1] <= xp:
+        _extend(len(THRESHOLDS) * 2)
+    return bisect.bisect_right(THRESHOLDS, xp)
+
+
+def levels_for_xp(xps: np.ndarray) -> np.ndarray:
+    """Vectorized version of `level_for_xp`, for computing the levels of many users at once.
+
+    Parameters
+    ----------
+    xps : np.ndarray
+        Array of XP values
+
+    Returns
+    -------
+    np.ndarray
+        Array of the corresponding levels
+    """
+
+    global _thresholds_array
+
+    xps = np.asarray(xps, dtype=np.int64)
+    if len(xps) and xps.max() >= THRESHOLDS[-1]:
+        level_for_xp(int(xps.max()))
+    if len(_thresholds_array) != len(THRESHOLDS):
+        _thresholds_array = np.array(THRESHOLDS, dtype=np.int64)
+    return np.searchsorted(_thresholds_array, xps, side='right')
@@ -0,0 +1,16 @@
+import functools
+import traceback
+
+
+def keep_running(func):
+    """Decorator for the body of a `tasks.loop`. An exception that escapes a loop's body stops the loop
+    for good, so exceptions are logged instead and the loop carries on at its next iteration.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            await func(*args, **kwargs)
+        except Exception:
+            traceback.print_exc()
+    return wrapper
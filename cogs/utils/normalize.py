@@ -0,0 +1,108 @@
+import string
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple
+
+from fold_to_ascii.mapping import translate_table as FOLD_TABLE
+
+# Cyrillic letters that are commonly used to get around the filter, and the latin letters they look like
+HOMOGLYPHS = (u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
+              u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
+# the same for Greek
+GREEK_HOMOGLYPHS = (u"αβγδεζηικμνοπρτυχωςΑΒΓΕΖΗΙΚΜΝΟΡΤΥΧ",
+                    u"aByde3nikmvonptuxwcABrEZHIKMNOPTYX")
+
+
+class ConfusablesTable(dict):
+    """A `str.translate` table that maps every character to lowercase ASCII in one pass.
+    Characters it doesn't know are dropped, just like `fold_to_ascii` drops them.
+    """
+
+    def __missing__(self, key):
+        return None
+
+
+def _build_confusables_table() -> ConfusablesTable:
+    """Build the table that replaces the homoglyph translate + `fold_to_ascii` + lowercasing of before.
+
+    In order of precedence, a character is mapped by:
+    the Cyrillic and Greek homoglyph lists, `fold_to_ascii`'s own table (accents, fullwidth, ligatures, ...),
+    and its NFKD compatibility decomposition with combining marks removed (mathematical alphanumerics,
+    letterlike and enclosed symbols, ...), if that decomposes to ASCII. Zero-width/format characters and
+    combining marks are removed. Every replacement is lowercased.
+    """
+
+    homoglyphs = dict(zip(HOMOGLYPHS[0] + GREEK_HOMOGLYPHS[0], HOMOGLYPHS[1] + GREEK_HOMOGLYPHS[1]))
+    table = ConfusablesTable()
+
+    # astral plane CJK and beyond has nothing that decomposes to ASCII
+    for codepoint in range(0x80, 0x20000):
+        char = chr(codepoint)
+        category = unicodedata.category(char)
+        if category in ("Cf", "Mn", "Me"):
+            table[codepoint] = None
+        elif unicodedata.decomposition(char).startswith("<"):
+            # a compatibility decomposition, i.e 𝐚 -> a, ａ -> a, 𝛂 -> α
+            decomposed = "".join(homoglyphs.get(c, c) for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+            if decomposed.isspace() and category != "Zs":
+                # spacing accents like ¨ and ´ decompose to a space and a combining mark
+                table[codepoint] = None
+            elif decomposed and decomposed.isascii():
+                table[codepoint] = decomposed.lower()
+
+    for codepoint, replacement in FOLD_TABLE:
+        table[codepoint] = replacement.lower()
+
+    for char, replacement in homoglyphs.items():
+        table[ord(char)] = replacement.lower()
+
+    # text used to be lowercased before folding, so uppercase letters also fold like their lowercase form
+    for codepoint in range(0x80, 0x20000):
+        lower = chr(codepoint).lower()
+        if codepoint not in table and len(lower) == 1 and ord(lower) in table:
+            table[codepoint] = table[ord(lower)]
+
+    return table
+
+
+# all translate tables are built once at import time instead of on every message
+CONFUSABLES_TABLE = _build_confusables_table()
+WHITESPACE_TABLE = str.maketrans('', '', "".join(chr(c) for c in range(128) if chr(c).isspace()))
+WHITESPACE_AND_PUNCTUATION_TABLE = str.maketrans('', '', "".join(chr(c) for c in range(128) if chr(c).isspace()) + string.punctuation)
+
+
+class Normalized(NamedTuple):
+    """The different views of a piece of text that the filters match against."""
+
+    folded: str
+    without_spaces: str
+    without_punctuation: str
+
+
+def normalize(text: str) -> Normalized:
+    """Normalize text for the filters: replace homoglyphs and other confusable characters, lowercase
+    and fold it to ASCII (all in a single translate), then strip whitespace and punctuation from the folded text.
+
+    Parameters
+    ----------
+    text : str
+        The text to normalize, i.e message content or a nickname
+
+    Returns
+    -------
+    Normalized
+        The folded text, the folded text without whitespace and the folded text without whitespace and punctuation
+    """
+
+    folded = text.translate(CONFUSABLES_TABLE)
+    # the confusables table only leaves ASCII behind, so these tables cover everything `str.split` and `string.punctuation` would
+    return Normalized(folded, folded.translate(WHITESPACE_TABLE), folded.translate(WHITESPACE_AND_PUNCTUATION_TABLE))
+
+
+@lru_cache(maxsize=2048)
+def normalize_cached(text: str) -> Normalized:
+    """Same as `normalize`, but remembers the results for recently seen text
+    so that repeated messages (i.e during spam) are only normalized once.
+    """
+
+    return normalize(text)
@@ -1,17 +1,31 @@
+import asyncio
+import datetime
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import discord
 import mongoengine
+import numpy as np
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from cogs.utils.cache import TTLCache
+from cogs.utils.leaderboard import LeaderboardIndex
+from cogs.utils.leveling import levels_for_xp
 from cogs.utils.tasks import Tasks
+from cogs.utils.wordfilter import CompiledFilter
 from data.case import Case
-from data.cases import Cases
 from data.filterword import FilterWord
 from data.guild import Guild
+from data.report import Report
 from data.tag import Tag
 from data.user import User
 from data.giveaway import Giveaway
 from discord.ext import commands
 
+# every Document that is stored in its own collection and declares indexes
+INDEXED_DOCUMENTS = (Case, Giveaway, Report, User)
+
 
 class Settings(commands.Cog):
     """This class is used to hold the state of the bot. It serves as the connection between the bot
@@ -28,6 +42,9 @@ class Settings(commands.Cog):
         """Initializes the state of the bot, including the connection with the MongoDB database,
         and the task scheduler.
 
+        If `BOTTY_ASYNC_DB` is set in the environment, all database operations are run
+        on a dedicated worker thread pool so that they don't block the event loop.
+
         Parameters
         ----------
         bot : discord.Client
@@ -38,15 +55,148 @@ class Settings(commands.Cog):
         self.tasks = None
         self.bot = bot
         self.guild_id = int(os.environ.get("BOTTY_MAINGUILD"))
+        # cached snapshot of the main guild's Guild document, see `guild()`
+        self._guild = None
+        # set view of the guild's filter_excluded_guilds, see `excluded_guilds()`
+        self._excluded_guilds = None
+        # filtered word -> hits that weren't written to the database yet, see `count_filter_hit()`
+        self.filter_hits = {}
+        # filter words compiled into an automaton, see `word_filter()`
+        self._word_filter = None
+        # in-memory XP ranking of all users, seeded by `load_leaderboard()`
+        self.leaderboard_index = None
+        # IDs of users who want to be pinged for reports while offline, seeded by `load_offline_pings()`
+        self.offline_pings = set()
+        # report message ID -> Report document of every report that still accepts reactions, seeded by `load_reports()`
+        self.reports = {}
+        # recently used User documents, see `user()`
+        self.user_cache = TTLCache(maxsize=int(os.environ.get("BOTTY_USER_CACHE_SIZE", 2048)),
+                                   ttl=float(os.environ.get("BOTTY_USER_CACHE_TTL", 300)))
+        # block of case IDs reserved by `next_case_id()`, [next, end)
+        self._case_id_block = int(os.environ.get("BOTTY_CASE_ID_BLOCK", 1))
+        self._case_id_next = 0
+        self._case_id_end = 0
+        self._case_id_lock = asyncio.Lock()
+
+        self.db_executor = None
+        if os.environ.get("BOTTY_ASYNC_DB"):
+            self.db_executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get("BOTTY_DB_WORKERS", 8)), thread_name_prefix="botty-db")
+
         self.permissions = Permissions(self.bot, self)
 
+        self.ensure_indexes()
         print("Loaded database")
 
+    def ensure_indexes(self) -> None:
+        """Create the indexes declared in the `meta` of every collection's Document, so that the hot queries
+        (leaderboard, birthdays, active giveaways, cases) never need a collection scan.
+        Indexes that already exist are left alone, so this is safe to run on every startup.
+        """
+
+        for document in INDEXED_DOCUMENTS:
+            document.ensure_indexes()
+
+    def cog_unload(self):
+        if self.db_executor is not None:
+            self.db_executor.shutdown(wait=True)
+
+    async def run_db(self, func, *args, **kwargs):
+        """Run a blocking database call. When the async backend is enabled, the call is handed off
+        to the database thread pool and awaited, otherwise it is run inline.
+
+        Parameters
+        ----------
+        func : callable
+            The blocking function to run, i.e a mongoengine query
+
+        Returns
+        -------
+        Any
+            Whatever `func` returned
+        """
+
+        if self.db_executor is None:
+            return func(*args, **kwargs)
+        return await asyncio.get_event_loop().run_in_executor(self.db_executor, functools.partial(func, *args, **kwargs))
+
     async def load_tasks(self):
         self.tasks = Tasks(self.bot)
 
+    async def load_leaderboard(self):
+        """Seed the in-memory XP ranking with every user's XP. Until this is done,
+        rank and leaderboard lookups fall back to querying the database.
+        """
+
+        users = await self.run_db(lambda: [(u['_id'], u.get('xp', 0)) for u in User._get_collection().find({}, {'xp': 1})])
+        self.leaderboard_index = LeaderboardIndex(users)
+
+    async def load_offline_pings(self):
+        """Seed the set of users who want to be pinged for reports while offline,
+        so that reports don't need to look up every moderator's User document.
+        """
+
+        ids = await self.run_db(lambda: [u['_id'] for u in User._get_collection().find({'offline_report_ping': True}, {'_id': 1})])
+        self.offline_pings = set(ids)
+
+    async def load_reports(self):
+        """Load the reports that were still open when the bot last shut down,
+        so that their reactions keep working after a restart.
+        """
+
+        reports = await self.run_db(lambda: list(Report.objects()))
+        self.reports = {report._id: report for report in reports}
+
+    async def add_report(self, report: Report) -> None:
+        """Register an open report, whose reactions are handled until `report.expires`.
+
+        Parameters
+        ----------
+        report : Report
+            The report to register
+        """
+
+        await self.save(report)
+        self.reports[report._id] = report
+
+    async def remove_report(self, id: int) -> None:
+        """Stop handling reactions to the report whose message ID is given by `id`.
+
+        Parameters
+        ----------
+        id : int
+            The report message's ID
+        """
+
+        self.reports.pop(id, None)
+        await self.run_db(lambda: Report.objects(_id=id).delete())
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.roles != after.roles:
+            self.permissions.invalidate(after.guild, after)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        self.permissions.invalidate(member.guild, member)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.permissions.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.permissions.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        if before.owner_id != after.owner_id:
+            self.permissions.invalidate()
+
     def guild(self) -> Guild:
-        """Returns the state of the main guild from the database.
+        """Returns the state of the main guild. The document is only fetched from the database
+        the first time this is called, after that a cached copy is returned until one of the
+        mutators below refreshes it.
 
         Returns
         -------
@@ -54,7 +204,51 @@ class Settings(commands.Cog):
             The Guild document object that holds information about the main guild.
         """
 
-        return Guild.objects(_id=self.guild_id).first()
+        if self._guild is None:
+            self._guild = Guild.objects(_id=self.guild_id).first()
+        return self._guild
+
+    async def refresh_guild(self) -> Guild:
+        """Reload the cached Guild document from the database. Must be called after every
+        write to the Guild document.
+
+        Returns
+        -------
+        Guild
+            The fresh Guild document.
+        """
+
+        self._guild = await self.run_db(lambda: Guild.objects(_id=self.guild_id).first())
+        self._excluded_guilds = None
+        return self._guild
+
+    def excluded_guilds(self) -> set:
+        """Returns the IDs of the guilds whose invites are allowed by the invite filter, as a set.
+        It is rebuilt whenever the Guild document is refreshed.
+
+        Returns
+        -------
+        set
+            The whitelisted guild IDs
+        """
+
+        if self._excluded_guilds is None:
+            self._excluded_guilds = set(self.guild().filter_excluded_guilds)
+        return self._excluded_guilds
+
+    def word_filter(self) -> CompiledFilter:
+        """Returns the guild's filtered words compiled into a single automaton. It is only rebuilt
+        after the filter list changes.
+
+        Returns
+        -------
+        CompiledFilter
+            The compiled filter list
+        """
+
+        if self._word_filter is None:
+            self._word_filter = CompiledFilter(self.guild().filter_words)
+        return self._word_filter
 
     async def get_nsa_channel(self, id) -> dict:
         """Returns the state of the main guild from the database.
@@ -85,7 +279,8 @@ class Settings(commands.Cog):
             "channel_id": channel_id,
             "webhook_id": webhook_id,
         }
-        g.save()
+        await self.run_db(g.save)
+        await self.refresh_guild()
 
     async def all_rero_mappings(self):
         g = self.guild()
@@ -98,7 +293,8 @@ class Settings(commands.Cog):
         the_key = list(mapping.keys())[0]
         current[str(the_key)] = mapping[the_key]
         g.reaction_role_mapping = current
-        g.save()
+        await self.run_db(g.save)
+        await self.refresh_guild()
 
     async def append_rero_mapping(self, mapping):
         g = self.guild()
@@ -106,7 +302,8 @@ class Settings(commands.Cog):
         the_key = list(mapping.keys())[0]
         current[str(the_key)] = current[str(the_key)] | mapping[the_key]
         g.reaction_role_mapping = current
-        g.save()
+        await self.run_db(g.save)
+        await self.refresh_guild()
 
     async def get_rero_mapping(self, id):
         g = self.guild()
@@ -119,50 +316,116 @@ class Settings(commands.Cog):
         g = self.guild()
         if str(id) in g.reaction_role_mapping.keys():
             g.reaction_role_mapping.pop(str(id))
-            g.save()
+            await self.run_db(g.save)
+            await self.refresh_guild()
 
     async def save_emoji_webhook(self, id):
-        g = Guild.objects(_id=self.guild_id).first()
+        g = self.guild()
         g.emoji_logging_webhook = id
-        g.save()
+        await self.run_db(g.save)
+        await self.refresh_guild()
 
     async def leaderboard(self) -> list:
-        return User.objects[0:100].only('_id', 'xp').order_by('-xp', '-_id').select_related()
+        """The User documents of the 100 users with the most XP, highest first.
+        """
+
+        if self.leaderboard_index is None:
+            return await self.run_db(lambda: list(User.objects[0:100].only('_id', 'xp', 'level').order_by('-xp', '-_id')))
+
+        ids = self.leaderboard_index.top(100)
+        users = await self.run_db(lambda: {u._id: u for u in User.objects(_id__in=ids).only('_id', 'xp', 'level')})
+        return [users[id] for id in ids if id in users]
 
     async def leaderboard_rank(self, xp):
-        users = User.objects().only('_id', 'xp')
-        overall = users().count()
-        rank = users(xp__gte=xp).count()
-        return (rank, overall)
+        """Returns a tuple of the rank of a user with `xp` XP and the total number of users.
+        """
+
+        if self.leaderboard_index is not None:
+            return (self.leaderboard_index.rank(xp), len(self.leaderboard_index))
+
+        def count():
+            users = User.objects().only('_id', 'xp')
+            overall = users().count()
+            rank = users(xp__gte=xp).count()
+            return (rank, overall)
 
-    async def inc_caseid(self) -> None:
-        """Increments Guild.case_id, which keeps track of the next available ID to
-        use for a case.
+        return await self.run_db(count)
+
+    async def next_case_id(self) -> int:
+        """Allocate the next available case ID. Guild.case_id keeps track of the next available ID;
+        IDs are reserved from it with a single atomic increment, `BOTTY_CASE_ID_BLOCK` at a time,
+        and then handed out from memory. Concurrent mod actions can never get the same ID.
+
+        Returns
+        -------
+        int
+            A case ID that hasn't been used before
         """
 
-        Guild.objects(_id=self.guild_id).update_one(inc__case_id=1)
+        async with self._case_id_lock:
+            if self._case_id_next >= self._case_id_end:
+                block = self._case_id_block
+                guild = await self.run_db(lambda: Guild._get_collection().find_one_and_update(
+                    {'_id': self.guild_id}, {'$inc': {'case_id': block}}, projection={'case_id': 1}, return_document=ReturnDocument.BEFORE))
+                self._case_id_next = guild['case_id']
+                self._case_id_end = guild['case_id'] + block
+
+            case_id = self._case_id_next
+            self._case_id_next += 1
+            return case_id
+
+    async def bulk_inc_xp(self, increments: dict) -> None:
+        """Apply buffered XP and level increments for many users in a single bulk write.
 
-    async def inc_xp(self, id, xp):
-        """Increments user xp.
+        Parameters
+        ----------
+        increments : dict
+            Maps user ID to an (xp, levels) pair to increment that user's fields by
         """
 
-        await self.user(id)
-        User.objects(_id=id).update_one(inc__xp=xp)
-        u = User.objects(_id=id).first()
-        return (u.xp, u.level)
+        ops = [UpdateOne({'_id': id}, self._with_user_defaults(id, {'$inc': {'xp': xp, 'level': levels}}), upsert=True)
+               for id, (xp, levels) in increments.items()]
+        await self.run_db(lambda: User._get_collection().bulk_write(ops, ordered=False))
+        for id in increments:
+            self.user_cache.pop(id)
+        if self.leaderboard_index is not None:
+            for id, (xp, _) in increments.items():
+                self.leaderboard_index.add(id, xp)
+
+    async def recompute_levels(self) -> int:
+        """Recompute the level of every user from their XP, in bulk, and fix the ones
+        whose stored level doesn't match.
 
-    async def inc_level(self, id) -> None:
-        """Increments user level.
+        Returns
+        -------
+        int
+            The number of users whose level was changed
         """
 
-        await self.user(id)
-        User.objects(_id=id).update_one(inc__level=1)
+        def recompute():
+            users = list(User._get_collection().find({}, {'xp': 1, 'level': 1}))
+            if not users:
+                return 0
+
+            ids = np.array([u['_id'] for u in users], dtype=np.int64)
+            xps = np.array([u.get('xp', 0) for u in users], dtype=np.int64)
+            stored = np.array([u.get('level', 0) for u in users], dtype=np.int64)
+            levels = levels_for_xp(xps)
+
+            changed = np.nonzero(levels != stored)[0]
+            if len(changed):
+                User._get_collection().bulk_write(
+                    [UpdateOne({'_id': int(ids[i])}, {'$set': {'level': int(levels[i])}}) for i in changed], ordered=False)
+            return len(changed)
+
+        changed = await self.run_db(recompute)
+        self.user_cache.clear()
+        return changed
 
     async def add_case(self, _id: int, case: Case) -> None:
-        """Cases holds all the cases for a particular user with id `_id` as an
-        EmbeddedDocumentListField. This function appends a given case object to
-        this list. If this user doesn't have any previous cases, we first add
-        a new Cases document to the database.
+        """Every case is stored as its own document in the `user_cases` collection. This function
+        attaches a given case object to the user with id `_id` and inserts it. If the case
+        doesn't have an ID yet, the next available one is allocated for it.
 
         Parameters
         ----------
@@ -172,66 +435,113 @@ class Settings(commands.Cog):
             The case we want to add to the user.
         """
 
-        # ensure this user has a cases document before we try to append the new case
-        await self.cases(_id)
-        Cases.objects(_id=_id).update_one(push__cases=case)
+        if case._id is None:
+            case._id = await self.next_case_id()
+        case.user_id = _id
+        await self.run_db(lambda: case.save(force_insert=True))
 
     async def add_filtered_word(self, fw: FilterWord) -> None:
-        Guild.objects(_id=self.guild_id).update_one(push__filter_words=fw)
+        await self.run_db(lambda: Guild.objects(_id=self.guild_id).update_one(push__filter_words=fw))
+        await self.refresh_guild()
+        self._word_filter = None
+
+    def count_filter_hit(self, word: FilterWord) -> None:
+        """Count a match of a filtered word. Counts are kept in memory until `flush_filter_hits()`.
+        """
+
+        self.filter_hits[word.word] = self.filter_hits.get(word.word, 0) + 1
+
+    def filter_word_hits(self, word: FilterWord) -> int:
+        """The total number of times a filtered word matched, including hits that weren't written yet.
+        """
+
+        return word.hits + self.filter_hits.get(word.word, 0)
+
+    async def flush_filter_hits(self) -> None:
+        """Write the hit counts of filtered words to the database, in one bulk write.
+        """
+
+        hits, self.filter_hits = self.filter_hits, {}
+        if not hits:
+            return
+
+        guild = self.guild()
+        ops = [UpdateOne({'_id': self.guild_id, 'filter_words.word': word}, {'$inc': {'filter_words.$.hits': n}})
+               for word, n in hits.items()]
+        try:
+            await self.run_db(lambda: Guild._get_collection().bulk_write(ops, ordered=False))
+        except Exception:
+            for word, n in hits.items():
+                self.filter_hits[word] = self.filter_hits.get(word, 0) + n
+            raise
+
+        # keep the cached Guild document in line with the database without reloading it
+        for word in guild.filter_words:
+            word.hits += hits.get(word.word, 0)
 
     async def remove_filtered_word(self, word: str):
-        return Guild.objects(_id=self.guild_id).update_one(pull__filter_words__word=FilterWord(word=word).word)
+        res = await self.run_db(lambda: Guild.objects(_id=self.guild_id).update_one(pull__filter_words__word=FilterWord(word=word).word))
+        await self.refresh_guild()
+        self._word_filter = None
+        return res
 
     async def add_tag(self, tag: Tag) -> None:
-        Guild.objects(_id=self.guild_id).update_one(push__tags=tag)
+        await self.run_db(lambda: Guild.objects(_id=self.guild_id).update_one(push__tags=tag))
+        await self.refresh_guild()
 
     async def remove_tag(self, tag: str):
-        return Guild.objects(_id=self.guild_id).update_one(pull__tags__name=Tag(name=tag).name)
+        res = await self.run_db(lambda: Guild.objects(_id=self.guild_id).update_one(pull__tags__name=Tag(name=tag).name))
+        await self.refresh_guild()
+        return res
 
     async def get_tag(self, name: str):
-        g = Guild.objects(_id=self.guild_id).first()
+        g = self.guild()
         for t in g.tags:
             if t.name == name:
                 t.use_count += 1
-                g.save()
+                await self.run_db(g.save)
                 return t
         return None
 
     async def add_whitelisted_guild(self, id: int):
         g = Guild.objects(_id=self.guild_id)
-        g2 = g.first()
+        g2 = self.guild()
         if id not in g2.filter_excluded_guilds:
-            g.update_one(push__filter_excluded_guilds=id)
+            await self.run_db(lambda: g.update_one(push__filter_excluded_guilds=id))
+            await self.refresh_guild()
             return True
         return False
 
     async def remove_whitelisted_guild(self, id: int):
         g = Guild.objects(_id=self.guild_id)
-        g2 = g.first()
+        g2 = self.guild()
         if id in g2.filter_excluded_guilds:
-            g.update_one(pull__filter_excluded_guilds=id)
+            await self.run_db(lambda: g.update_one(pull__filter_excluded_guilds=id))
+            await self.refresh_guild()
             return True
         return False
 
     async def add_ignored_channel(self, id: int):
         g = Guild.objects(_id=self.guild_id)
-        g2 = g.first()
+        g2 = self.guild()
         if id not in g2.filter_excluded_channels:
-            g.update_one(push__filter_excluded_channels=id)
+            await self.run_db(lambda: g.update_one(push__filter_excluded_channels=id))
+            await self.refresh_guild()
             return True
         return False
 
     async def remove_ignored_channel(self, id: int):
         g = Guild.objects(_id=self.guild_id)
-        g2 = g.first()
+        g2 = self.guild()
         if id in g2.filter_excluded_channels:
-            g.update_one(pull__filter_excluded_channels=id)
+            await self.run_db(lambda: g.update_one(pull__filter_excluded_channels=id))
+            await self.refresh_guild()
             return True
         return False
 
-    async def inc_points(self, _id: int, points: int) -> None:
+    async def inc_points(self, _id: int, points: int) -> User:
         """Increments the warnpoints by `points` of a user whose ID is given by `_id`.
-        If the user doesn't have a User document in the database, first create that.
+        If the user doesn't have a User document in the database, it is created by the same operation.
 
         Parameters
         ----------
@@ -239,30 +549,59 @@ class Settings(commands.Cog):
             The user's ID to whom we want to add/remove points
         points : int
             The amount of points to increment the field by, can be negative to remove points
+
+        Returns
+        -------
+        User
+            The user's document after the update
         """
 
-        # first we ensure this user has a User document in the database before continuing
-        await self.user(_id)
-        User.objects(_id=_id).update_one(inc__warn_points=points)
+        return await self.upsert_user(_id, {'$inc': {'warn_points': points}})
 
-    async def set_warn_kicked(self, _id: int) -> None:
+    async def set_warn_kicked(self, _id: int) -> User:
         """Set the `was_warn_kicked` field in the User object of the user, whose ID is given by `_id`,
         to True. (this happens when a user reaches 400+ points for the first time and is kicked).
-        If the user doesn't have a User document in the database, first create that.
+        If the user doesn't have a User document in the database, it is created by the same operation.
 
         Parameters
         ----------
         _id : int
             The user's ID who we want to set `was_warn_kicked` for.
+
+        Returns
+        -------
+        User
+            The user's document after the update
+        """
+
+        return await self.upsert_user(_id, {'$set': {'was_warn_kicked': True}})
+
+    async def set_offline_ping(self, _id: int, val: bool) -> User:
+        """Set whether the user, whose ID is given by `_id`, wants to be pinged for reports while offline.
+        If the user doesn't have a User document in the database, it is created by the same operation.
+
+        Parameters
+        ----------
+        _id : int
+            The user's ID who we want to set `offline_report_ping` for.
+        val : bool
+            Whether they want to be pinged or not
+
+        Returns
+        -------
+        User
+            The user's document after the update
         """
 
-        # first we ensure this user has a User document in the database before continuing
-        await self.user(_id)
-        User.objects(_id=_id).update_one(set__was_warn_kicked=True)
+        user = await self.upsert_user(_id, {'$set': {'offline_report_ping': val}})
+        if val:
+            self.offline_pings.add(_id)
+        else:
+            self.offline_pings.discard(_id)
+        return user
 
     async def get_case(self, _id: int, case_id: int) -> Case:
         """Get the case with ID `case_id`, which belongs to the punishee given by ID `_id`.
-        If the user doesn't have a Cases document in the database, first create that.
 
         Parameters
         ----------
@@ -274,17 +613,16 @@ class Settings(commands.Cog):
         Returns
         -------
         Case
-            The Case object representing the case.
+            The Case object representing the case, or None if that user has no such case.
         """
 
-        # first we ensure this user has a Cases document in the database before continuing
-        await self.cases(_id)
-        case = Cases.objects(_id=_id).first()
+        case = await self.run_db(lambda: Case.objects(_id=case_id, user_id=_id).first())
         return case
 
     async def user(self, id: int) -> User:
         """Look up the User document of a user, whose ID is given by `id`.
         If the user doesn't have a User document in the database, first create that.
+        Recently used documents are served from `user_cache`, which every mutator below updates or invalidates.
 
         Parameters
         ----------
@@ -297,63 +635,140 @@ class Settings(commands.Cog):
             The User document we found from the database.
         """
 
-        user = User.objects(_id=id).first()
-        # first we ensure this user has a User document in the database before continuing
-        if not user:
-            user = User()
-            user._id = id
-            user.save()
+        user = self.user_cache.get(id)
+        if user is not None:
+            return user
+
+        # a single upsert that only writes the defaults if this user doesn't have a document yet
+        user = await self.upsert_user(id, {})
+        if self.leaderboard_index is not None and id not in self.leaderboard_index.xp:
+            self.leaderboard_index.set(id, user.xp)
+        return user
+
+    def _with_user_defaults(self, id: int, update: dict) -> dict:
+        """Add a `$setOnInsert` of all User defaults to an update, so that upserting it creates
+        a complete User document. Fields that the update itself touches are left out.
+        """
+
+        touched = {field for fields in update.values() for field in fields}
+        defaults = {k: v for k, v in User(_id=id).to_mongo().items() if k != '_id' and k not in touched}
+        return dict(update, **{'$setOnInsert': defaults}) if defaults else update
+
+    async def upsert_user(self, id: int, update: dict) -> User:
+        """Apply `update` to the User document of the user whose ID is given by `id`, creating
+        the document if it doesn't exist yet, in one database operation.
+
+        Parameters
+        ----------
+        id : int
+            The ID of the user
+        update : dict
+            MongoDB update operators to apply, i.e {'$inc': {'xp': 5}}
+
+        Returns
+        -------
+        User
+            The user's document after the update
+        """
+
+        update = self._with_user_defaults(id, update)
+
+        def upsert():
+            try:
+                doc = User._get_collection().find_one_and_update(
+                    {'_id': id}, update, upsert=True, return_document=ReturnDocument.AFTER)
+            except DuplicateKeyError:
+                # another upsert created the document at the same time, so this one can just update it
+                doc = User._get_collection().find_one_and_update(
+                    {'_id': id}, update, return_document=ReturnDocument.AFTER)
+            return User._from_son(doc)
+
+        user = await self.run_db(upsert)
+        self.user_cache.set(id, user)
         return user
+
+    async def save(self, document: mongoengine.Document) -> None:
+        """Save a document that was fetched through Settings, i.e after changing some fields
+        of a User document returned by `user()`.
+
+        Parameters
+        ----------
+        document : mongoengine.Document
+            The document to save
+        """
+
+        await self.run_db(document.save)
+        if isinstance(document, User):
+            # the caller's copy may predate updates made by other mutators in the meantime,
+            # so let the next `user()` read the document back instead of caching this one
+            self.user_cache.pop(document._id)
     
     async def transfer_profile(self, oldmember, newmember):
         u = await self.user(oldmember)
         u._id = newmember
-        u.save()
+        await self.save(u)
+        self.user_cache.pop(oldmember)
         
         u2 = await self.user(oldmember)
         u2.xp = 0
         u2.level = 0
-        u2.save()
-        
-        cases = await self.cases(oldmember)
-        cases._id = newmember
-        cases.save()
+        await self.save(u2)
         
-        cases2 = await self.cases(oldmember)
-        cases2.cases = []
-        cases2.save()
+        case_count = await self.run_db(lambda: Case.objects(user_id=oldmember).update(set__user_id=newmember))
+
+        if self.leaderboard_index is not None:
+            self.leaderboard_index.set(newmember, u.xp)
+            self.leaderboard_index.set(oldmember, 0)
         
-        return u, len(cases.cases)
+        return u, case_count
 
     async def retrieve_birthdays(self, date):
-        return User.objects(birthday=date)
+        return await self.run_db(lambda: list(User.objects(birthday=date)))
 
-    async def cases(self, id: int) -> Cases:
-        """Return the Document representing the cases of a user, whose ID is given by `id`
-        If the user doesn't have a Cases document in the database, first create that.
+    async def cases(self, id: int, page: int = 0, per_page: int = 0) -> list:
+        """Return the cases of a user, whose ID is given by `id`, newest first. UNMUTE cases are left out.
 
         Parameters
         ----------
         id : int
             The user whose cases we want to look up.
+        page : int, optional
+            Which page of cases to return, by default the first
+        per_page : int, optional
+            How many cases make up a page, by default 0 which returns all cases
 
         Returns
         -------
-        Cases
-            [description]
+        list
+            List of Case documents
         """
 
-        cases = Cases.objects(_id=id).first()
-        # first we ensure this user has a Cases document in the database before continuing
-        if cases is None:
-            cases = Cases()
-            cases._id = id
-            cases.save()
-        return cases
+        def find():
+            cases = Case.objects(user_id=id, _type__ne="UNMUTE").order_by('-date')
+            if per_page:
+                cases = cases.skip(page * per_page).limit(per_page)
+            return list(cases)
+
+        return await self.run_db(find)
+
+    async def count_cases(self, id: int) -> int:
+        """Return the amount of cases of a user, whose ID is given by `id`. UNMUTE cases are left out.
+
+        Parameters
+        ----------
+        id : int
+            The user whose cases we want to count.
+
+        Returns
+        -------
+        int
+            The number of cases
+        """
+
+        return await self.run_db(lambda: Case.objects(user_id=id, _type__ne="UNMUTE").count())
 
     async def rundown(self, id: int) -> list:
         """Return the 3 most recent cases of a user, whose ID is given by `id`
-        If the user doesn't have a Cases document in the database, first create that.
 
         Parameters
         ----------
@@ -362,23 +777,30 @@ class Settings(commands.Cog):
 
         Returns
         -------
-        Cases
-            [description]
-        """
-
-        cases = Cases.objects(_id=id).first()
-        # first we ensure this user has a Cases document in the database before continuing
-        if cases is None:
-            cases = Cases()
-            cases._id = id
-            cases.save()
-            return []
-
-        cases = cases.cases
-        cases = filter(lambda x: x._type != "UNMUTE", cases)
-        cases = sorted(cases, key=lambda i: i['date'])
-        cases.reverse()
-        return cases[0:3]
+        list
+            List of up to 3 Case documents
+        """
+
+        return await self.cases(id, page=0, per_page=3)
+
+    async def cases_by_mod(self, mod_id: int, since: datetime.datetime) -> list:
+        """Return all cases across all users that were handled by the moderator with ID `mod_id`
+        since `since`, newest first.
+
+        Parameters
+        ----------
+        mod_id : int
+            The moderator's ID
+        since : datetime.datetime
+            Oldest case date to include
+
+        Returns
+        -------
+        list
+            List of Case documents
+        """
+
+        return await self.run_db(lambda: list(Case.objects(mod_id=mod_id, date__gte=since).order_by('-date')))
     
     async def get_giveaway(self, id: int) -> Giveaway:
         """
@@ -394,8 +816,19 @@ class Settings(commands.Cog):
         -------
         Giveaway
         """
-        giveaway = Giveaway.objects(_id=id).first()
+        giveaway = await self.run_db(lambda: Giveaway.objects(_id=id).first())
         return giveaway
+
+    async def active_giveaways(self) -> list:
+        """
+        Return the Documents of all giveaways that haven't ended yet.
+
+        Returns
+        -------
+        list
+            List of Giveaway documents
+        """
+        return await self.run_db(lambda: list(Giveaway.objects(is_ended=False)))
     
     async def add_giveaway(self, id: int, channel: int, name: str, entries: list, winners: int, ended: bool = False, prev_winners=[]) -> None:
         """
@@ -422,7 +855,7 @@ class Settings(commands.Cog):
         giveaway.winners = winners
         giveaway.is_ended = ended
         giveaway.previous_winners = prev_winners
-        giveaway.save()
+        await self.save(giveaway)
 
 
 class Permissions:
@@ -456,30 +889,31 @@ class Permissions:
         the_guild = settings.guild()
 
         # This dict maps a permission level to a lambda function which, when given the right paramters,
-        # will return True or False if a user has that permission level.
+        # will return True or False if a user directly qualifies for that permission level.
+        # Having a higher level also implies all the lower ones, see `level()`.
         self.permissions = {
             0: lambda x, y: True,
 
-            1: (lambda guild, m: self.hasAtLeast(guild, m, 2) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_memberplus) in m.roles)),
+            1: (lambda guild, m: guild.id == guild_id
+                and guild.get_role(the_guild.role_memberplus) in m.roles),
 
-            2: (lambda guild, m: self.hasAtLeast(guild, m, 3) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_memberpro) in m.roles)),
+            2: (lambda guild, m: guild.id == guild_id
+                and guild.get_role(the_guild.role_memberpro) in m.roles),
 
-            3: (lambda guild, m: self.hasAtLeast(guild, m, 4) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_memberedition) in m.roles)),
+            3: (lambda guild, m: guild.id == guild_id
+                and guild.get_role(the_guild.role_memberedition) in m.roles),
 
-            4: (lambda guild, m: self.hasAtLeast(guild, m, 5) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_genius) in m.roles)),
+            4: (lambda guild, m: guild.id == guild_id
+                and guild.get_role(the_guild.role_genius) in m.roles),
 
-            5: (lambda guild, m: self.hasAtLeast(guild, m, 6) or (guild.id == guild_id
-                and guild.get_role(the_guild.role_moderator) in m.roles)),
+            5: (lambda guild, m: guild.id == guild_id
+                and guild.get_role(the_guild.role_moderator) in m.roles),
 
-            6: (lambda guild, m: self.hasAtLeast(guild, m, 7) or (guild.id == guild_id
-                and m.guild_permissions.manage_guild)),
+            6: (lambda guild, m: guild.id == guild_id
+                and m.guild_permissions.manage_guild),
 
-            7: (lambda guild, m: self.hasAtLeast(guild, m, 9) or (guild.id == guild_id
-                and m == guild.owner)),
+            7: (lambda guild, m: guild.id == guild_id
+                and m == guild.owner),
 
             9: (lambda guild, m: guild.id == guild_id
                 and m.id == bot.owner_id),
@@ -501,9 +935,52 @@ class Permissions:
             10: "Bot owner",
         }
 
+        # (guild ID, member ID) -> the member's effective permission level
+        self.levels = {}
+
+    def level(self, guild: discord.Guild, member: discord.Member) -> int:
+        """Returns the highest permission level `member` has in `guild`. This is computed once
+        and then cached until the member's roles, or the guild's roles, change.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            The guild to check
+        member : discord.Member
+            The member whose permission level we want
+
+        Returns
+        -------
+        int
+            The member's permission level
+        """
+
+        key = (guild.id, member.id)
+        level = self.levels.get(key)
+        if level is None:
+            level = next(lvl for lvl in sorted(self.permissions, reverse=True) if self.permissions[lvl](guild, member))
+            self.levels[key] = level
+        return level
+
+    def invalidate(self, guild: discord.Guild = None, member: discord.Member = None) -> None:
+        """Forget cached permission levels, either of one member or, if no member is given, of everyone.
+
+        Parameters
+        ----------
+        guild : discord.Guild, optional
+            The guild the member is in
+        member : discord.Member, optional
+            The member whose level changed
+        """
+
+        if member is None:
+            self.levels.clear()
+        else:
+            self.levels.pop((guild.id, member.id), None)
+
     def hasAtLeast(self, guild: discord.Guild, member: discord.Member, level: int) -> bool:
         """Checks whether a user given by `member` has at least the permission level `level`
-        in guild `guild`. Using the `self.permissions` dict-lambda thing.
+        in guild `guild`, using the member's cached permission level.
 
         Parameters
         ----------
@@ -520,7 +997,7 @@ class Permissions:
             True if the user has that level, otherwise False.
         """
 
-        return self.permissions[level](guild, member)
+        return self.level(guild, member) >= level
 
     def level_info(self, level: int) -> str:
         return self.permission_names[level]
@@ -0,0 +1,149 @@
+import time
+from collections import OrderedDict, deque
+from typing import NamedTuple
+
+
+class SpamRule(NamedTuple):
+    """A rule is broken when `count` or more events happen within `seconds`."""
+
+    count: int
+    seconds: float
+
+    @classmethod
+    def parse(cls, value: str) -> "SpamRule":
+        """Parse a rule written as `count/seconds`, i.e `8/10`.
+        """
+
+        count, seconds = value.split("/")
+        return cls(int(count), float(seconds))
+
+
+class UserActivity:
+    """Ring buffers of a user's recent activity. Each buffer holds at most as many entries as its rule's
+    `count`, so checking a rule never looks at more than a handful of entries.
+    """
+
+    __slots__ = ("messages", "contents", "mentions", "filter_hits", "last_seen")
+
+    def __init__(self, detector: "SpamDetector"):
+        # timestamps of recent messages
+        self.messages = deque(maxlen=detector.flood.count)
+        # (timestamp, content hash) of recent messages
+        self.contents = deque(maxlen=detector.duplicates.count * 2)
+        # (timestamp, number of mentions) of recent messages that mentioned someone
+        self.mentions = deque(maxlen=detector.mentions.count)
+        # timestamps of recent filter hits
+        self.filter_hits = deque(maxlen=detector.filter_hits.count)
+        self.last_seen = 0.0
+
+
+class SpamDetector:
+    """Sliding-window spam detection for message floods, duplicate messages, mass mentions and
+    repeated filter hits. Users that haven't sent anything for `idle` seconds are forgotten.
+    """
+
+    def __init__(self, flood: SpamRule, duplicates: SpamRule, mentions: SpamRule, filter_hits: SpamRule, idle: float = 300):
+        """Set up the detector.
+
+        Parameters
+        ----------
+        flood : SpamRule
+            Number of messages within a time window
+        duplicates : SpamRule
+            Number of messages with the same content within a time window
+        mentions : SpamRule
+            Number of user and role mentions within a time window
+        filter_hits : SpamRule
+            Number of messages removed by the filters within a time window
+        idle : float
+            Seconds after which a user's activity is forgotten
+        """
+
+        self.flood = flood
+        self.duplicates = duplicates
+        self.mentions = mentions
+        self.filter_hits = filter_hits
+        self.idle = idle
+        # user ID -> UserActivity, least recently active first
+        self.users = OrderedDict()
+
+    def activity(self, id: int, now: float) -> UserActivity:
+        """The activity buffers of a user, creating them if needed. Also forgets idle users;
+        since users are kept in order of activity, only the ones that are actually idle are looked at.
+        """
+
+        while self.users:
+            oldest = next(iter(self.users.values()))
+            if now - oldest.last_seen <= self.idle:
+                break
+            self.users.popitem(last=False)
+
+        activity = self.users.get(id)
+        if activity is None:
+            activity = self.users[id] = UserActivity(self)
+        else:
+            self.users.move_to_end(id)
+        activity.last_seen = now
+        return activity
+
+    def forget(self, id: int) -> None:
+        """Forget a user's activity, i.e after they were muted.
+        """
+
+        self.users.pop(id, None)
+
+    def message(self, id: int, content: str, mentions: int, now: float = None) -> str:
+        """Record a message and check it against the flood, duplicate and mention rules.
+
+        Parameters
+        ----------
+        id : int
+            The author's ID
+        content : str
+            The message content
+        mentions : int
+            The number of users and roles mentioned by the message
+        now : float, optional
+            Time of the message, defaults to now
+
+        Returns
+        -------
+        str
+            Which rule the user broke, or None
+        """
+
+        now = time.monotonic() if now is None else now
+        activity = self.activity(id, now)
+
+        activity.messages.append(now)
+        if len(activity.messages) == self.flood.count and now - activity.messages[0] <= self.flood.seconds:
+            return "Message spam"
+
+        if content:
+            digest = hash(content)
+            activity.contents.append((now, digest))
+            same = sum(1 for then, other in activity.contents if other == digest and now - then <= self.duplicates.seconds)
+            if same >= self.duplicates.count:
+                return "Duplicate message spam"
+
+        if mentions:
+            activity.mentions.append((now, mentions))
+            total = sum(n for then, n in activity.mentions if now - then <= self.mentions.seconds)
+            if total >= self.mentions.count:
+                return "Mention spam"
+
+        return None
+
+    def filter_hit(self, id: int, now: float = None) -> bool:
+        """Record that a message of the user was removed by the filters.
+
+        Returns
+        -------
+        bool
+            True if the user broke the filter hit rule
+        """
+
+        now = time.monotonic() if now is None else now
+        activity = self.activity(id, now)
+        activity.filter_hits.append(now)
+        return len(activity.filter_hits) == self.filter_hits.count and now - activity.filter_hits[0] <= self.filter_hits.seconds
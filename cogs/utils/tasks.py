@@ -142,18 +142,16 @@ async def remove_mute(id: int) -> None:
             if user is not None:
                 await user.remove_roles(mute_role)
                 case = Case(
-                    _id=BOT_GLOBAL.settings.guild().case_id,
                     _type="UNMUTE",
                     mod_id=BOT_GLOBAL.user.id,
                     mod_tag=str(BOT_GLOBAL.user),
                     reason="Temporary mute expired.",
                 )
-                await BOT_GLOBAL.settings.inc_caseid()
                 await BOT_GLOBAL.settings.add_case(user.id, case)
 
                 u = await BOT_GLOBAL.settings.user(id=user.id)
                 u.is_muted = False
-                u.save()
+                await BOT_GLOBAL.settings.save(u)
 
                 log = await prepare_unmute_log(BOT_GLOBAL.user, user, case)
 
@@ -173,18 +171,16 @@ async def remove_mute(id: int) -> None:
 
             else:
                 case = Case(
-                    _id=BOT_GLOBAL.settings.guild().case_id,
                     _type="UNMUTE",
                     mod_id=BOT_GLOBAL.user.id,
                     mod_tag=str(BOT_GLOBAL.user),
                     reason="Temporary mute expired.",
                 )
-                await BOT_GLOBAL.settings.inc_caseid()
                 await BOT_GLOBAL.settings.add_case(id, case)
 
                 u = await BOT_GLOBAL.settings.user(id=id)
                 u.is_muted = False
-                u.save()
+                await BOT_GLOBAL.settings.save(u)
 
 
 def remove_bday_callback(id: int) -> None:
@@ -292,7 +288,7 @@ async def end_giveaway(channel_id: int, message_id: int, winners: int) -> None:
     g.entries = reacted_ids
     g.is_ended = True
     g.previous_winners = winner_ids
-    g.save()
+    await BOT_GLOBAL.settings.save(g)
 
     await message.edit(embed=embed)
     await message.clear_reactions()
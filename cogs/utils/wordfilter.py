@@ -0,0 +1,379 @@
+import re
+import string
+import traceback
+from collections import deque
+from functools import lru_cache
+
+try:
+    import re._parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from cogs.utils.normalize import Normalized
+
+MODES = ("substring", "word", "regex")
+MAX_REGEX_LENGTH = 200
+# messages are folded to ASCII before they're filtered, so these are all the characters a regex will see
+ALPHABET = frozenset(chr(c) for c in range(128))
+
+
+class Automaton:
+    """Aho-Corasick automaton used to look for many patterns in a piece of text at once.
+    Searching is linear in the length of the text, no matter how many patterns there are.
+    """
+
+    def __init__(self, patterns: list):
+        """Build the automaton.
+
+        Parameters
+        ----------
+        patterns : list
+            The strings to look for. A pattern's index in this list is what `find` returns.
+        """
+
+        # node 0 is the root; each node has its outgoing edges, a failure link,
+        # and the indices of all patterns that end at it (including via failure links)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                nxt = self.goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][char] = nxt
+                node = nxt
+            self.output[node].append(index)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def find(self, text: str) -> set:
+        """Find which patterns occur in `text`.
+
+        Parameters
+        ----------
+        text : str
+            Text to search
+
+        Returns
+        -------
+        set
+            Indices of the patterns that were found
+        """
+
+        found = set(self.output[0])
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+
+class CompiledFilter:
+    """The guild's filtered words compiled into a single automaton. This is built once
+    whenever the filter list changes (see `Settings.word_filter`), not per message.
+    Verdicts are cached per compiled filter, so changing the filter list also starts a fresh cache.
+
+    Substring and whole-word rules share the automaton; whole-word hits are then checked for
+    word boundaries. Regex rules are combined into one pattern that rejects most text in a single scan,
+    only the messages it matches are checked against each regex to find which ones hit.
+    """
+
+    def __init__(self, words: list, cache_size: int = 4096):
+        """Compile the filter list.
+
+        Parameters
+        ----------
+        words : list
+            List of FilterWord objects, in the order they're stored in the Guild document
+        cache_size : int
+            How many verdicts to remember, see `verdict`
+        """
+
+        self.words = list(words)
+        # indices into `self.words` of the rules in the automaton, by automaton pattern index
+        self.literals = [i for i, word in enumerate(self.words) if word.mode != "regex"]
+        self.automaton = Automaton([self.words[i].word.lower() for i in self.literals])
+        self.boundaries = {i: re.compile(r"(?<!\w)" + re.escape(word.word.lower()) + r"(?!\w)")
+                           for i, word in enumerate(self.words) if word.mode == "word"}
+        self.regexes = []
+        for i, word in enumerate(self.words):
+            if word.mode == "regex":
+                try:
+                    self.regexes.append((i, re.compile(word.word, re.IGNORECASE)))
+                except re.error:
+                    # can't match anything; skipped so that one bad rule can't break the whole filter
+                    traceback.print_exc()
+        self.combined = None
+        if self.regexes:
+            try:
+                self.combined = combine_regexes([regex.pattern for _, regex in self.regexes])
+            except re.error:
+                # the rules can't be combined into one pattern, so every message is matched against each of them
+                traceback.print_exc()
+        self.verdict = lru_cache(maxsize=cache_size)(self._verdict)
+
+    def _literal_hits(self, text: str) -> set:
+        return {self.literals[i] for i in self.automaton.find(text)}
+
+    def _regex_hits(self, text: str) -> set:
+        if not self.regexes or (self.combined is not None and not self.combined.search(text)):
+            return set()
+        return {i for i, regex in self.regexes if regex.search(text)}
+
+    def _on_boundaries(self, hits: set, text: str) -> set:
+        return {i for i in hits if i not in self.boundaries or self.boundaries[i].search(text)}
+
+    def find(self, text: str) -> set:
+        """Indices into `self.words` of all rules that match `text`.
+        """
+
+        if not self.words:
+            return set()
+        return self._on_boundaries(self._literal_hits(text), text) | self._regex_hits(text)
+
+    def search(self, folded: str, without_spaces: str, without_punctuation: str) -> list:
+        """Look for filtered words in the normalized forms of a message. Every rule is matched against
+        the folded message, and substring rules that aren't marked `false_positive` are also matched against
+        the versions without whitespace and punctuation (which have no word boundaries to speak of).
+
+        Parameters
+        ----------
+        folded : str
+            The lowercased, ASCII-folded message
+        without_spaces : str
+            `folded` with all whitespace removed
+        without_punctuation : str
+            `without_spaces` with all punctuation removed
+
+        Returns
+        -------
+        list
+            The FilterWord objects that matched, in filter list order. Each carries its own
+            bypass/notify/piracy/false_positive flags.
+        """
+
+        if not self.words:
+            return []
+
+        hits = self.find(folded)
+        relaxed = self._literal_hits(without_spaces) | self._literal_hits(without_punctuation)
+        hits.update(i for i in relaxed if self.words[i].mode == "substring" and not self.words[i].false_positive)
+
+        return [self.words[i] for i in sorted(hits)]
+
+    def _verdict(self, normalized: Normalized, level: int) -> tuple:
+        """The filtered words in a message that a member with permission level `level` can't bypass.
+        Exposed as `verdict`, which remembers the results so that duplicate messages (copypasta, raids)
+        are only searched once.
+
+        Parameters
+        ----------
+        normalized : Normalized
+            The normalized message, see `normalize`
+        level : int
+            The author's permission level
+
+        Returns
+        -------
+        tuple
+            The FilterWord objects that matched and can't be bypassed, in filter list order
+        """
+
+        return tuple(word for word in self.search(*normalized) if level < word.bypass)
+
+
+def combine_regexes(patterns: list) -> re.Pattern:
+    """Combine regexes into one pattern that matches wherever any of them matches.
+
+    Parameters
+    ----------
+    patterns : list
+        The regexes
+
+    Returns
+    -------
+    re.Pattern
+        The combined pattern
+
+    Raises
+    ------
+    re.error
+        If the regexes can't be combined
+    """
+
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE)
+
+
+def check_regex(pattern: str) -> None:
+    """Make sure a regex is safe to run on every message before it's added to the filter.
+    Rejects what can make a regex take exponential or high polynomial time on a long message:
+    backreferences, quantifiers inside a repeated group (i.e `(a+)+` or `(a?a)*`), alternatives inside
+    a repeated group that can start with the same character (i.e `(a|aa)*`), and unbounded quantifiers
+    that can match the same characters one after the other (i.e `\\w+\\w*` or `\\w+\\s*\\w+`).
+
+    Parameters
+    ----------
+    pattern : str
+        The regex
+
+    Raises
+    ------
+    ValueError
+        If the regex is invalid or unsafe, with the reason
+    """
+
+    if len(pattern) > MAX_REGEX_LENGTH:
+        raise ValueError(f"Filter regexes can be at most {MAX_REGEX_LENGTH} characters long.")
+
+    try:
+        parsed = sre_parse.parse(pattern)
+        re.compile(pattern, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"That regex is invalid: {e}")
+
+    # these work on their own, but not once the rule is combined with the others
+    if parsed.state.flags != sre_parse.parse("").state.flags:
+        raise ValueError("Flags that apply to the whole regex, like `(?i)`, aren't allowed. Use a scoped group like `(?i:...)` instead.")
+    if parsed.state.groupdict:
+        raise ValueError("Named groups aren't allowed in filter regexes, use `(?:...)` instead.")
+
+    _check_parsed(parsed, False)
+    _check_adjacent(parsed, [])
+
+
+def _first_literal(branch):
+    if branch and branch[0][0] is sre_parse.LITERAL:
+        return chr(branch[0][1]).lower()
+    if branch and branch[0][0] is sre_parse.SUBPATTERN:
+        return _first_literal(branch[0][1][-1])
+    return None
+
+
+def _check_parsed(parsed, in_repeat: bool) -> None:
+    for op, av in parsed:
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            raise ValueError("Backreferences aren't allowed in filter regexes.")
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            _, high, sub = av
+            if in_repeat:
+                raise ValueError("Quantifiers inside a repeated group, like `(a+)+` or `(a?b)*`, aren't allowed in filter regexes.")
+            _check_parsed(sub, high > 1)
+        elif op is sre_parse.SUBPATTERN:
+            _check_parsed(av[-1], in_repeat)
+        elif op is sre_parse.BRANCH:
+            if in_repeat:
+                # alternatives that can't start with the same character never compete for the same text
+                firsts = [_first_literal(branch) for branch in av[1]]
+                if None in firsts or len(set(firsts)) != len(firsts):
+                    raise ValueError("Alternatives inside a repeated group must each start with a different letter, "
+                                     "i.e `(?:cat|dog)+` is fine but `(a|aa)+` isn't.")
+            for branch in av[1]:
+                _check_parsed(branch, in_repeat)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            _check_parsed(av[1], in_repeat)
+
+
+def _check_adjacent(parsed, open_sets: list) -> list:
+    """Walk a regex in order, keeping track of the characters that the unbounded quantifiers seen so far
+    could still be matching at this point. Two unbounded quantifiers that can match the same character
+    with nothing in between to tell them apart can split a run of that character in any number of ways,
+    which takes polynomial time in the length of the run for every position the regex is tried at.
+    Returns the sets that are still open after `parsed`.
+    """
+
+    for op, av in parsed:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            low, high, sub = av
+            chars = _charset(sub)
+            if high == sre_parse.MAXREPEAT:
+                if any(chars & other for other in open_sets):
+                    raise ValueError("Unbounded quantifiers that can match the same characters one after the other, "
+                                     "like `\\w+\\w*` or `\\w+\\s*\\w+`, aren't allowed in filter regexes.")
+                open_sets = open_sets + [chars] if low == 0 else [chars]
+            elif low > 0:
+                open_sets = _narrow(open_sets, chars)
+        elif op is sre_parse.SUBPATTERN:
+            open_sets = _check_adjacent(av[-1], open_sets)
+        elif op is sre_parse.BRANCH:
+            open_sets = [chars for branch in av[1] for chars in _check_adjacent(branch, open_sets)]
+        elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            pass
+        else:
+            open_sets = _narrow(open_sets, _charset([(op, av)]))
+    return open_sets
+
+
+def _narrow(open_sets: list, chars: frozenset) -> list:
+    # after a character that has to be matched, a quantifier before it is only still open if it could have matched that character
+    return [chars & other for other in open_sets if chars & other]
+
+
+def _charset(parsed) -> frozenset:
+    """The characters that `parsed` can match (a superset for anything more complex than a single character)."""
+
+    chars = set()
+    for op, av in parsed:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            chars |= _charset(av[2])
+        elif op is sre_parse.SUBPATTERN:
+            chars |= _charset(av[-1])
+        elif op is sre_parse.BRANCH:
+            for branch in av[1]:
+                chars |= _charset(branch)
+        elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            pass
+        else:
+            chars |= {c for c in ALPHABET if _matches(op, av, c)}
+    return frozenset(chars)
+
+
+def _matches(op, av, char: str) -> bool:
+    # filter regexes are case insensitive
+    if op is sre_parse.LITERAL:
+        return char.lower() == chr(av).lower()
+    if op is sre_parse.NOT_LITERAL:
+        return char.lower() != chr(av).lower()
+    if op is sre_parse.ANY:
+        return char != "\n"
+    if op is sre_parse.RANGE:
+        return av[0] <= ord(char.lower()) <= av[1] or av[0] <= ord(char.upper()) <= av[1]
+    if op is sre_parse.CATEGORY:
+        return _CATEGORIES.get(av, lambda c: True)(char)
+    if op is sre_parse.IN:
+        negate = bool(av) and av[0][0] is sre_parse.NEGATE
+        items = av[1:] if negate else av
+        return any(_matches(item_op, item_av, char) for item_op, item_av in items) != negate
+    # anything else, assume it can match any character
+    return True
+
+
+_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: str.isdigit,
+    sre_parse.CATEGORY_NOT_DIGIT: lambda c: not c.isdigit(),
+    sre_parse.CATEGORY_SPACE: lambda c: c in string.whitespace,
+    sre_parse.CATEGORY_NOT_SPACE: lambda c: c not in string.whitespace,
+    sre_parse.CATEGORY_WORD: lambda c: c.isalnum() or c == "_",
+    sre_parse.CATEGORY_NOT_WORD: lambda c: not (c.isalnum() or c == "_"),
+}
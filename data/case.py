@@ -1,8 +1,9 @@
 import mongoengine
 import datetime
 
-class Case(mongoengine.EmbeddedDocument):
+class Case(mongoengine.Document):
     _id               = mongoengine.IntField(required=True)
+    user_id           = mongoengine.IntField(required=True)
     _type             = mongoengine.StringField(required=True)
     date              = mongoengine.DateTimeField(default=datetime.datetime.now, required=True)
     until             = mongoengine.DateTimeField(default=None)
@@ -14,4 +15,14 @@ class Case(mongoengine.EmbeddedDocument):
     lifted_by_tag     = mongoengine.StringField()
     lifted_by_id      = mongoengine.IntField()
     lifted_reason     = mongoengine.StringField()
-    lifted_date       = mongoengine.DateField()
\ No newline at end of file
+    lifted_date       = mongoengine.DateField()
+
+    meta = {
+        'db_alias': 'default',
+        'collection': 'user_cases',
+        # one document per case, looked up by case ID (_id), by punishee, or by moderator
+        'indexes': [
+            ('user_id', '-date'),
+            ('mod_id', '-date'),
+        ]
+    }
@@ -7,3 +7,8 @@ class FilterWord(mongoengine.EmbeddedDocument):
     word                 = mongoengine.StringField(required=True)
     false_positive       = mongoengine.BooleanField(default=False)
     piracy               = mongoengine.BooleanField(default=False)
+    # "substring" matches anywhere, "word" only as a whole word, "regex" treats `word` as a regular expression
+    mode                 = mongoengine.StringField(default="substring", choices=["substring", "word", "regex"])
+    # shadow words are only logged and counted when they match, so they can be tried out on real traffic
+    shadow               = mongoengine.BooleanField(default=False)
+    hits                 = mongoengine.IntField(default=0)
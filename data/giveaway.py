@@ -13,5 +13,9 @@ class Giveaway(mongoengine.Document):
 
     meta = {
         'db_alias': 'default',
-        'collection': 'giveaways'
+        'collection': 'giveaways',
+        # the giveaway loop only cares about giveaways that haven't ended yet
+        'indexes': [
+            'is_ended',
+        ]
     }
\ No newline at end of file
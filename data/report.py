@@ -0,0 +1,16 @@
+import mongoengine
+
+class Report(mongoengine.Document):
+    _id               = mongoengine.IntField(required=True)
+    channel_id        = mongoengine.IntField(required=True)
+    user_id           = mongoengine.IntField(required=True)
+    expires           = mongoengine.DateTimeField(required=True)
+
+    meta = {
+        'db_alias': 'default',
+        'collection': 'reports',
+        # one document per open report, keyed by the report message's ID
+        'indexes': [
+            'expires',
+        ]
+    }
@@ -19,5 +19,11 @@ class User(mongoengine.Document):
 
     meta = {
         'db_alias': 'default',
-        'collection': 'users'
+        'collection': 'users',
+        # the leaderboard orders users by XP, highest first, ties broken by highest ID first,
+        # and the birthday loop looks up everyone whose birthday is today
+        'indexes': [
+            ('-xp', '-_id'),
+            'birthday',
+        ]
     }
\ No newline at end of file
@@ -0,0 +1,55 @@
+import datetime
+
+import mongoengine
+
+from data.case import Case
+from data.giveaway import Giveaway
+from data.user import User
+
+# the queries the bot runs often, see cogs/utils/settings.py
+HOT_QUERIES = {
+    "birthdays of the day": lambda: User.objects(birthday=[1, 1]),
+    "leaderboard": lambda: User.objects.only('_id', 'xp', 'level').order_by('-xp', '-_id').limit(100),
+    "active giveaways": lambda: Giveaway.objects(is_ended=False),
+    "case by ID": lambda: Case.objects(_id=1, user_id=1),
+    "cases of a user": lambda: Case.objects(user_id=1, _type__ne="UNMUTE").order_by('-date'),
+    "cases by a moderator": lambda: Case.objects(mod_id=1, date__gte=datetime.datetime.now()).order_by('-date'),
+}
+
+
+def stages(plan: dict):
+    """Yield the stage names of a query plan and all of its input stages.
+    """
+
+    yield plan.get("stage")
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            yield from stages(child)
+
+
+def explain() -> int:
+    """Run `explain()` on every hot query and report the stages of its winning plan,
+    flagging the ones that do a full collection scan.
+
+    Returns
+    -------
+    int
+        The number of queries that scan a whole collection
+    """
+
+    scans = 0
+    for name, query in HOT_QUERIES.items():
+        plan = query().explain()["queryPlanner"]["winningPlan"]
+        used = list(stages(plan))
+        flag = "COLLSCAN" in used
+        scans += flag
+        print(f"{'!! ' if flag else '   '}{name}: {' <- '.join(used)}")
+
+    print(f"DONE, {scans} of {len(HOT_QUERIES)} queries scan a whole collection.")
+    return scans
+
+if __name__ == "__main__":
+        mongoengine.register_connection(alias="default", name="botty")
+        for document in (Case, Giveaway, User):
+            document.ensure_indexes()
+        exit(1 if explain() else 0)
@@ -2,7 +2,6 @@ import datetime
 import logging
 import re
 import os
-import string
 
 import discord
 import humanize
@@ -11,9 +10,11 @@ from data.case import Case
 import cogs.utils.logs as logger
 from discord.ext import commands
 from dotenv import find_dotenv, load_dotenv
-from fold_to_ascii import fold
 
 from cogs.monitors.report import report
+from cogs.utils.cache import TTLCache
+from cogs.utils.filterpipeline import FilterContext, FilterPipeline
+from cogs.utils.spam import SpamDetector, SpamRule
 
 logging.basicConfig(level=logging.INFO)
 
@@ -49,6 +50,7 @@ initial_extensions = [
                     'cogs.monitors.filter',
                     'cogs.monitors.logging',
                     'cogs.monitors.reactionroles',
+                    'cogs.monitors.report',
                     'cogs.monitors.xp',
 ]
 
@@ -58,6 +60,11 @@ intents.messages = True
 intents.presences = True
 mentions = discord.AllowedMentions(everyone=False, users=True, roles=False)
 
+# cached for invites that don't exist (anymore), for a shorter time than valid ones since they can be created later
+INVALID_INVITE = 0
+INVALID_INVITE_TTL = 300
+
+
 class Bot(commands.Bot):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -65,8 +72,41 @@ class Bot(commands.Bot):
         self.settings = self.get_cog("Settings")
         self.spoiler_filter = r'\|\|(.*?)\|\|'
         self.invite_filter = r'(?:https?://)?discord(?:(?:app)?\.com/invite|\.gg)\/{1,}[a-zA-Z0-9]+/?'
-        self.spam_cooldown = commands.CooldownMapping.from_cooldown(2, 10.0, commands.BucketType.user)
+        # each rule is "count/seconds": that many messages, duplicates, mentions or filter hits within that many seconds
+        self.spam = SpamDetector(
+            flood=SpamRule.parse(os.environ.get("BOTTY_SPAM_FLOOD", "8/10")),
+            duplicates=SpamRule.parse(os.environ.get("BOTTY_SPAM_DUPLICATES", "4/30")),
+            mentions=SpamRule.parse(os.environ.get("BOTTY_SPAM_MENTIONS", "10/15")),
+            filter_hits=SpamRule.parse(os.environ.get("BOTTY_SPAM_FILTER_HITS", "3/10")),
+        )
+        # invite code -> ID of the guild it points to, or INVALID_INVITE if it doesn't exist
+        self.invite_cache = TTLCache(maxsize=1024, ttl=3600)
+        # the filters that report come before the ones that only delete, so a message that trips several
+        # still gets reported; the invite filter only goes to the network for invites it hasn't seen recently
+        self.filters = FilterPipeline([
+            ("word", self.do_word_filter),
+            ("invite", self.do_invite_filter),
+            ("spoiler", self.do_spoiler_filter),
+            ("newline", self.do_newline_filter),
+        ])
     
+    async def close(self):
+        # write out XP and filter hits that are still buffered in memory before shutting down;
+        # if the database is down that's lost, but the bot must still disconnect
+        try:
+            xp = self.get_cog("Xp")
+            if xp is not None:
+                try:
+                    await xp.flush()
+                except Exception:
+                    logging.exception("Failed to flush XP on shutdown")
+            try:
+                await self.settings.flush_filter_hits()
+            except Exception:
+                logging.exception("Failed to flush filter hits on shutdown")
+        finally:
+            await super().close()
+
     async def on_message(self, message):
         if message.author.bot:
             return
@@ -75,6 +115,9 @@ class Bot(commands.Bot):
             if not self.settings.permissions.hasAtLeast(message.guild, message.author, 6):
                 if await self.filter(message):
                     return
+            if not self.settings.permissions.hasAtLeast(message.guild, message.author, 5):
+                if await self.spam_filter(message):
+                    return
                                 
         await self.process_commands(message)
 
@@ -83,90 +126,107 @@ class Bot(commands.Bot):
             return False
         if message.author.bot:
             return False
-        guild = self.settings.guild()
         if message.guild.id != self.settings.guild_id:
             return False
+        guild = self.settings.guild()
         if message.channel.id in guild.filter_excluded_channels:
             return False
 
-        return await self.do_word_filter(message, guild) or await self.do_invite_filter(message) or await self.do_spoiler_filter(message, guild)
-    
-    async def do_word_filter(self, message, guild):
+        ctx = FilterContext(message, guild, self.settings.permissions.level(message.guild, message.author))
+        return await self.filters.run(ctx)
+
+    async def do_word_filter(self, ctx):
         """
         BAD WORD FILTER
         """
-        symbols = (u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
-                   u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
-
-        tr = {ord(a): ord(b) for a, b in zip(*symbols)}
-
-        folded_message = fold(message.content.translate(tr).lower()).lower()
-        folded_without_spaces = "".join(folded_message.split())
-        folded_without_spaces_and_punctuation = folded_without_spaces.translate(str.maketrans('', '', string.punctuation))
+        message = ctx.message
         word_found = False
-        
-        if folded_message:
+
+        if ctx.normalized.folded:
             reported = False
-            for word in guild.filter_words:
-                if not self.settings.permissions.hasAtLeast(message.guild, message.author, word.bypass):
-                    if (word.word.lower() in folded_message) or \
-                        (not word.false_positive and word.word.lower() in folded_without_spaces) or \
-                        (not word.false_positive and word.word.lower() in folded_without_spaces_and_punctuation):
-                        # remove all whitespace, punctuation in message and run filter again
-                        dev_role = message.guild.get_role(self.settings.guild().role_dev)
-                        if not (word.piracy and message.channel.id == self.settings.guild().channel_development and dev_role in message.author.roles):
-                            # ignore if this is a piracy word and the channel is #development and the user has dev role
-                            word_found = True
-                            await self.delete(message)
-                            if not reported:
-                                await self.do_filter_notify(message.author, message.channel, word.word)
-                                await self.ratelimit(message)
-                                reported = True
-                            if word.notify:
-                                await report(self, message, message.author, word.word)
-                                return True
+            # all filtered words in the message (including in the versions without whitespace and punctuation)
+            # that the author can't bypass; duplicate messages are answered from the verdict cache
+            hits = self.settings.word_filter().verdict(ctx.normalized, ctx.level)
+            for word in hits:
+                if word.shadow:
+                    self.settings.count_filter_hit(word)
+                    logging.info(f"Shadow filter word {word.word!r} matched message {message.id} by {message.author} ({message.author.id})")
+                    continue
+                if not (word.piracy and message.channel.id == ctx.guild.channel_development and ctx.has_dev_role()):
+                    # ignore if this is a piracy word and the channel is #development and the user has dev role
+                    self.settings.count_filter_hit(word)
+                    word_found = True
+                    await self.delete(message)
+                    if not reported:
+                        await self.do_filter_notify(message.author, message.channel, word.word)
+                        await self.ratelimit(message)
+                        reported = True
+                    if word.notify:
+                        await report(self, message, message.author, word.word)
+                        return True
         return word_found
-    
-    async def do_invite_filter(self, message):
+
+    async def do_invite_filter(self, ctx):
         """
         INVITE FILTER
         """
-        if message.content:
-            if not self.settings.permissions.hasAtLeast(message.guild, message.author, 5):
-                invites = re.findall(self.invite_filter, message.content, flags=re.S)
-                if invites:
-                    whitelist = self.settings.guild().filter_excluded_guilds
-                    for invite in invites:
-                        try:
-                            invite = await self.fetch_invite(invite)
-
-                            id = None
-                            if isinstance(invite, discord.Invite):
-                                if invite.guild is not None:
-                                    id = invite.guild.id
-                                else:
-                                    id = 123
-                            elif isinstance(invite, discord.PartialInviteGuild) or isinstance(invite, discord.PartialInviteChannel):
-                                id = invite.id
-
-                            if id not in whitelist:
-                                await self.delete(message)
-                                await self.ratelimit(message)
-                                await report(self, message, message.author, invite, invite=invite)
-                                return True
-
-                        except discord.errors.NotFound:
-                            await self.delete(message)
-                            await self.ratelimit(message)
-                            await report(self, message, message.author, invite, invite=invite)
-                            return True
+        message = ctx.message
+        if message.content and ctx.level < 5:
+            invites = re.findall(self.invite_filter, message.content, flags=re.S)
+            if invites:
+                whitelist = self.settings.excluded_guilds()
+                for invite in invites:
+                    id = await self.resolve_invite_guild(invite)
+                    if id not in whitelist:
+                        await self.delete(message)
+                        await self.ratelimit(message)
+                        await report(self, message, message.author, invite, invite=invite)
+                        return True
         return False
+
+    async def resolve_invite_guild(self, invite):
+        """Look up the ID of the guild an invite points to. Results are cached by invite code,
+        so an invite that is posted repeatedly is only fetched once.
+
+        Parameters
+        ----------
+        invite : str
+            The invite link
+
+        Returns
+        -------
+        int
+            The guild's ID, or INVALID_INVITE if the invite doesn't exist
+        """
+
+        code = discord.utils.resolve_invite(invite)
+        id = self.invite_cache.get(code)
+        if id is not None:
+            return id
+
+        try:
+            invite = await self.fetch_invite(code)
+
+            id = None
+            if isinstance(invite, discord.Invite):
+                if invite.guild is not None:
+                    id = invite.guild.id
+                else:
+                    id = 123
+            elif isinstance(invite, discord.PartialInviteGuild) or isinstance(invite, discord.PartialInviteChannel):
+                id = invite.id
+            self.invite_cache.set(code, id)
+        except discord.errors.NotFound:
+            id = INVALID_INVITE
+            self.invite_cache.set(code, id, ttl=INVALID_INVITE_TTL)
+        return id
     
-    async def do_spoiler_filter(self, message, guild):
+    async def do_spoiler_filter(self, ctx):
         """
         SPOILER FILTER
         """
-        if not self.settings.permissions.hasAtLeast(message.guild, message.author, 5):
+        message = ctx.message
+        if ctx.level < 5:
             if re.search(self.spoiler_filter, message.content, flags=re.S):
                 await self.delete(message)
                 return True
@@ -175,18 +235,19 @@ class Bot(commands.Bot):
                 if a.is_spoiler():
                     await self.delete(message)
                     return True
+        return False
 
+    async def do_newline_filter(self, ctx):
         """
         NEWLINE FILTER
         """
-        if not self.settings.permissions.hasAtLeast(message.guild, message.author, 5):
+        message = ctx.message
+        if ctx.level < 5:
             if len(message.content.splitlines()) > 100:
-                dev_role = message.guild.get_role(guild.role_dev)
-                if not dev_role or dev_role not in message.author.roles:
+                if not ctx.has_dev_role():
                     await self.delete(message)
                     await self.ratelimit(message)
                     return True
-
         return False
 
     async def delete(self, message):
@@ -207,9 +268,25 @@ class Bot(commands.Bot):
             embed.set_footer(text=footer)
             await channel.send(member.mention, embed=embed, delete_after=10)
 
-    async def mute(self, ctx: commands.Context, user: discord.Member) -> None:
+    async def spam_filter(self, message):
+        """
+        SPAM FILTER
+        """
+        if message.channel.id in self.settings.guild().filter_excluded_channels:
+            return False
+
+        reason = self.spam.message(message.author.id, message.content, len(message.raw_mentions) + len(message.raw_role_mentions))
+        if reason is None:
+            return False
+
+        await self.delete(message)
+        self.spam.forget(message.author.id)
+        ctx = await self.get_context(message, cls=commands.Context)
+        await self.mute(ctx, message.author, reason)
+        return True
+
+    async def mute(self, ctx: commands.Context, user: discord.Member, reason: str = "Filter spam") -> None:
         dur = "15m"
-        reason = "Filter spam"
 
         now = datetime.datetime.now()
         delta = pytimeparse.parse(dur)
@@ -222,7 +299,6 @@ class Bot(commands.Bot):
             return
 
         case = Case(
-            _id=self.settings.guild().case_id,
             _type="MUTE",
             date=now,
             mod_id=ctx.me.id,
@@ -241,11 +317,10 @@ class Bot(commands.Bot):
                 raise commands.BadArgument(
                     "An error occured, this user is probably already muted")
 
-        await self.settings.inc_caseid()
         await self.settings.add_case(user.id, case)
         u = await self.settings.user(id=user.id)
         u.is_muted = True
-        u.save()
+        await self.settings.save(u)
 
         await user.add_roles(mute_role)
 
@@ -263,10 +338,8 @@ class Bot(commands.Bot):
             pass           
 
     async def ratelimit(self, message):
-        current = message.created_at.replace(tzinfo=datetime.timezone.utc).timestamp()
-
-        bucket = self.spam_cooldown.get_bucket(message)
-        if bucket.update_rate_limit(current):
+        if self.spam.filter_hit(message.author.id):
+            self.spam.forget(message.author.id)
             ctx = await self.get_context(message, cls=commands.Context)
             await self.mute(ctx, message.author)
 
@@ -300,6 +373,9 @@ async def on_ready():
         f'\n\nLogged in as: {bot.user.name} - {bot.user.id}\nVersion: {discord.__version__}\n')
     bot.load_extension('cogs.commands.misc.music')
     await bot.settings.load_tasks()
+    await bot.settings.load_leaderboard()
+    await bot.settings.load_offline_pings()
+    await bot.settings.load_reports()
     print(f'Successfully logged in and booted...!')
 
 
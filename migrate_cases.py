@@ -0,0 +1,65 @@
+import asyncio
+import os
+
+import mongoengine
+from dotenv import find_dotenv, load_dotenv
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from data.case import Case
+from data.guild import Guild
+
+load_dotenv(find_dotenv())
+
+
+def renumber(case: dict) -> int:
+    """Insert a case whose ID was handed out twice under a fresh ID, allocated the same way the bot does.
+    """
+
+    guild = Guild._get_collection().find_one_and_update(
+        {"_id": int(os.environ.get("BOTTY_MAINGUILD"))}, {"$inc": {"case_id": 1}}, projection={"case_id": 1}, return_document=ReturnDocument.BEFORE)
+    Case._get_collection().insert_one(dict(case, _id=guild["case_id"]))
+    return guild["case_id"]
+
+
+async def migrate():
+    """Move cases from the old layout, where every user had one document in `cases` holding
+    all their cases in an embedded list, to one document per case in `user_cases`.
+    Safe to run more than once, cases that were already migrated are skipped.
+    Cases whose ID was handed out twice are given a new ID.
+    """
+
+    print("STARTING CASES MIGRATION...")
+    old = Case._get_db()["cases"]
+    new = Case._get_collection()
+
+    migrated = 0
+    skipped = 0
+    renumbered = 0
+    for doc in old.find():
+        cases = [dict(case, user_id=doc["_id"]) for case in doc.get("cases", [])]
+        if not cases:
+            continue
+
+        try:
+            migrated += len(new.insert_many(cases, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            migrated += e.details["nInserted"]
+            for error in e.details["writeErrors"]:
+                case = error["op"]
+                if error["code"] != 11000:
+                    raise
+                # either already migrated (possibly under a new ID by an earlier run), or a case ID that was handed out twice
+                if new.find_one({"user_id": case["user_id"], "_type": case["_type"], "date": case["date"]}) is not None:
+                    skipped += 1
+                    continue
+                new_id = renumber(case)
+                renumbered += 1
+                print(f"Case #{case['_id']} of user {doc['_id']} clashed with another case, it is now case #{new_id}")
+
+    Case.ensure_indexes()
+    print(f"DONE, migrated {migrated} cases, skipped {skipped} already migrated, renumbered {renumbered}. The old `cases` collection was left as is.")
+
+if __name__ == "__main__":
+        mongoengine.register_connection(alias="default", name="botty")
+        res = asyncio.get_event_loop().run_until_complete( migrate() )